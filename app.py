@@ -1,394 +1,228 @@
+import json
 import os
 
-import datetime
-from flask import Flask, render_template, flash, redirect, session, g, url_for
-from sqlalchemy.exc import IntegrityError
+import click
+from flask import Flask, session, g, request, current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
 
-from sqlalchemy import or_
-import requests
-from functions import do_login, do_logout
+from assets import init_assets, build_assets
+from functions import cache, CURR_USER_KEY
+from models import db, connect_db, User, Book, REPLICA_BIND
+from replay import ReplayStore
+from tracing import init_tracing, span
 
-from flask_caching import Cache
+STATIC_ENDPOINTS = ("static", "assets.asset")
 
-from forms import UserAddForm, LoginForm,  UserEditForm
-from models import db, connect_db, User, Book, UserBook
 
-CURR_USER_KEY = "curr_user"
-BASE_URL = "https://api.nytimes.com/svc/books/v3/lists/"
-API_KEY = "hqYOQpGSpdTrvEmdSR6k6ZGNvzJvC6nf"
+def create_app(test_config=None):
+    """Create and configure the Flask app.
 
-app = Flask(__name__)
+    Nothing here touches the database or the network, so the app can be
+    built in the gunicorn master (--preload) and forked safely.
+    """
 
+    app = Flask(__name__)
+
+    # Get DB_URI from environ variable (useful for production/testing) or,
+    # if not set there, use development local db.
+    app.config['SQLALCHEMY_DATABASE_URI'] = (
+        os.environ.get('DATABASE_URL', 'postgresql:///nyt_best_sellers'))
+
+    # Optional read replica: read-only views are routed there (see models.py)
+    if os.environ.get('DATABASE_REPLICA_URL'):
+        app.config['SQLALCHEMY_BINDS'] = {
+            REPLICA_BIND: os.environ['DATABASE_REPLICA_URL']}
+
+    # Connection pool tuning, shared by the primary and the replica engines
+    app.config['SQLALCHEMY_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+    app.config['SQLALCHEMY_MAX_OVERFLOW'] = int(
+        os.environ.get('DB_MAX_OVERFLOW', 10))
+    app.config['SQLALCHEMY_POOL_TIMEOUT'] = int(
+        os.environ.get('DB_POOL_TIMEOUT', 10))
+    app.config['SQLALCHEMY_POOL_RECYCLE'] = int(
+        os.environ.get('DB_POOL_RECYCLE', 1800))
+    app.config['SQLALCHEMY_POOL_PRE_PING'] = (
+        os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true')
+    # Statement timeout in milliseconds (0 disables it)
+    app.config['DATABASE_STATEMENT_TIMEOUT'] = int(
+        os.environ.get('DB_STATEMENT_TIMEOUT', 5000))
+    # Seconds a user keeps reading from the primary after writing something
+    app.config['REPLICA_LAG_WINDOW'] = int(
+        os.environ.get('REPLICA_LAG_WINDOW', 5))
+
+    # DEBUG comes from FLASK_ENV=development (or FLASK_DEBUG=1), never on
+    # in production
+    app.config['CACHE_TYPE'] = "SimpleCache"
+    app.config['CACHE_DEFAULT_TIMEOUT'] = 300
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ECHO'] = False
+    app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', "it's a secret")
+    # Also keep book metadata in the (non per-process) cache, see book_cache.py
+    app.config['BOOK_CACHE_SHARED'] = (
+        os.environ.get('BOOK_CACHE_SHARED', 'false').lower() == 'true')
+    app.config['NYT_API_KEY'] = os.environ.get(
+        'NYT_API_KEY', "hqYOQpGSpdTrvEmdSR6k6ZGNvzJvC6nf")
+    # "live", "record" (live, saving the responses) or "replay" (offline,
+    # from the saved responses), see replay.py
+    app.config['NYT_MODE'] = os.environ.get('NYT_MODE', "live")
+    app.config['NYT_RECORDINGS'] = os.environ.get(
+        'NYT_RECORDINGS', os.path.join(app.root_path, "recordings"))
+    # Send the large pages while they render (see render_streamed)
+    app.config['STREAM_TEMPLATES'] = (
+        os.environ.get('STREAM_TEMPLATES', 'true').lower() == 'true')
+    # Request tracing (see tracing.py): the share of requests traced, the
+    # duration (ms) from which a request is always traced, and where the
+    # traces go (an import path, or an object with an export method)
+    app.config['TRACING'] = (
+        os.environ.get('TRACING', 'true').lower() == 'true')
+    app.config['TRACE_SAMPLE_RATE'] = float(
+        os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+    app.config['TRACE_SLOW_MS'] = int(os.environ.get('TRACE_SLOW_MS', 1000))
+    app.config['TRACE_EXPORTER'] = os.environ.get(
+        'TRACE_EXPORTER', "tracing.JSONLinesExporter")
+    app.config['TRACE_FILE'] = os.environ.get('TRACE_FILE', "traces.jsonl")
+    # Compiled templates are kept there, so workers and restarts don't
+    # compile them again (Jinja's default is a directory in /tmp)
+    app.config['JINJA_BYTECODE_CACHE_DIR'] = os.environ.get(
+        'JINJA_BYTECODE_CACHE_DIR')
+
+    if test_config:
+        app.config.update(test_config)
+
+    # Must be set before app.jinja_env is first used
+    app.jinja_options = dict(
+        app.jinja_options,
+        bytecode_cache=FileSystemBytecodeCache(
+            app.config['JINJA_BYTECODE_CACHE_DIR']))
+
+    if app.debug:
+        init_debug_tools(app)
+
+    cache.init_app(app)
+    app.extensions['nyt_recordings'] = ReplayStore(
+        app.config['NYT_RECORDINGS'])
+
+    connect_db(app)
+
+    app.cli.add_command(reconcile_counters_command)
+    app.cli.add_command(worker_command)
+    app.cli.add_command(enqueue_command)
+    app.cli.add_command(build_assets_command)
+
+    app.before_request(route_reads)
+    app.before_request(add_user_to_g)
+
+    # Blueprints are imported here so importing this module stays cheap
+    from auth import auth
+    from books import books
+    from users import users
+
+    app.register_blueprint(auth)
+    app.register_blueprint(books)
+    app.register_blueprint(users)
+
+    init_assets(app)
+
+    init_tracing(app, cache)
+
+    return app
+
+
+def init_debug_tools(app):
+    """Development only helpers, e.g. the debug toolbar (if installed)."""
+
+    try:
+        from flask_debugtoolbar import DebugToolbarExtension
+    except ImportError:
+        return
+
+    DebugToolbarExtension(app)
+
+
+def warm_templates(app):
+    """Compile every template now (from the bytecode cache when it can).
+
+    Called in the gunicorn master, so the forked workers start with the
+    templates compiled instead of each compiling them on its first
+    requests.
+    """
 
-# Get DB_URI from environ variable (useful for production/testing) or,
-# if not set there, use development local db.
-app.config['SQLALCHEMY_DATABASE_URI'] = (
-    os.environ.get('DATABASE_URL', 'postgresql:///nyt_best_sellers'))
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
 
-app.config['DEBUG'] = True
-app.config['CACHE_TYPE'] = "SimpleCache"
-app.config['CACHE_DEFAULT_TIMEOUT'] = 300
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ECHO'] = False
-app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', "it's a secret")
 
-cache = Cache(app)
+def route_reads():
+    """Send the queries of read-only views to the replica (if configured)."""
 
-connect_db(app)
+    view = current_app.view_functions.get(request.endpoint)
+    g.use_replica = getattr(view, "read_only", False)
 
 
-@app.before_request
 def add_user_to_g():
     """If we're logged in, add curr user to Flask global."""
 
-    if CURR_USER_KEY in session:
-        g.user = User.query.get(session[CURR_USER_KEY])
-
-    else:
+    # Static files are the same for everyone, don't query the user for them
+    if request.endpoint in STATIC_ENDPOINTS:
         g.user = None
+        return
 
-#######################################################################################
-#####LOGIN-LOGOUT-SIGNUP ROUTES ##########################################################
-#######################################################################################
-
-
-@app.route('/signup', methods=["GET", "POST"])
-def signup():
-    """Handle user signup.
-
-    Create new user and add to DB. Redirect to home page.
-
-    If form not valid, present form.
-
-    If the there already is a user with that username: flash message
-    and re-present form.
-    """
-
-    form = UserAddForm()
-
-    if form.validate_on_submit():
-        try:
-            user = User.signup(
-                username=form.username.data,
-                password=form.password.data,
-                email=form.email.data,
-                image_url=form.image_url.data or User.image_url.default.arg,
-            )
-            db.session.commit()
-
-        except IntegrityError:
-            # We will get an Integrity Error if the username already exist
-            flash("Username already taken", 'danger')
-            return render_template('users/signup.html', form=form)
-
-        do_login(user)
-
-        return redirect("/")
-
-    else:
-        return render_template('users/signup.html', form=form)
-
-
-@app.route('/login', methods=["GET", "POST"])
-def login():
-    """Handle user login."""
-
-    form = LoginForm()
-
-    if form.validate_on_submit():
-        # If authentication fails we get false and render the form again
-        user = User.authenticate(form.username.data,
-                                 form.password.data)
-        # If true we login and redirect
-        if user:
-            do_login(user)
-            flash(f"Hello, {user.username}!", "success")
-            return redirect("/")
-
-        flash("Invalid credentials.", 'danger')
-
-    return render_template('users/login.html', form=form)
-
-
-@app.route('/logout')
-def logout():
-    """Handle logout of user."""
-
-    do_logout()
-
-    return redirect("/")
-
-#######################################################################################
-##################BOOK ROUTES ##########################################################
-#######################################################################################
-
-
-@app.route('/')
-def homepage():
-    """Show homepage:
-
-    - anon users: no books
-    - logged in: current week's best sellers
-    """
-    # If the user is not the one in session render the anonym root route
-    if g.user:
-
-        unformated_date = datetime.datetime.now()
-        date = unformated_date.strftime("%Y-%m-%d")
-        lists = do_books_overview(date)
-        return render_template('home.html', lists=lists)
-
-    else:
-        return render_template('home-anon.html')
-
-
-@app.route('/books/<isbn>')
-def show_book(isbn):
-    """Show book acording to the ISBN"""
-    # If the user is not the one in session redirect
-    if not g.user:
-        flash("Access unauthorized.", "danger")
-        return redirect("/")
-
-    # If the book is in our DB, we don't make a request and retrieve the information from our databse
-
-    book = Book.query.filter_by(isbn_10=isbn).first()
-
-    if book:
-        return render_template('book_show.html', book=book)
-    # If the book is not in our DB, we retieve the data from the API
-    else:
-        try:
-            res = requests.get(
-                f"{BASE_URL}best-sellers/history.json",
-                params={"api-key": API_KEY,
-                        "isbn": isbn})
-            data = res.json()
-            book = data["results"][0]
-            # API response is a list, therefore we get the first book even when it's only one book in the list
-
-            title = book["title"]
-            author = book["author"]
-            description = book["description"]
-            publisher = book["publisher"]
+    with span("add_user_to_g"):
+        if CURR_USER_KEY in session:
+            g.user = User.query.get(session[CURR_USER_KEY])
 
-            # ISBN_10 is already given from the url
-            book2 = Book.add_book(title=title,
-                                  author=author,
-                                  description=description,
-                                  publisher=publisher,
-                                  isbn_10=isbn)
-
-            db.session.commit()
-
-            db_book = Book.query.get_or_404(book2.id)
-            # We'll see information about the current book
-            return render_template('book_show.html', book=db_book)
-
-        # The API is currently throwing empty results when looking for particular books with ISBN_10
-        except IndexError as e:
-            flash("Book's details curently unavailable.", "danger")
-            return redirect("/")
-
-
-@app.route('/books/<isbn>/track', methods=["POST"])
-def track_book(isbn):
-    """Make current user and book relation for tracking the book"""
-    # If the user is not the one in session redirect
-    if not g.user:
-        flash("Access unauthorized.", "danger")
-        return redirect("/")
-
-    book = Book.query.filter_by(isbn_10=isbn).first()
-
-    # If the book is in the DB, we let the user track the book
-
-    if book:
-        try:
-
-            track_book = UserBook(user_id=g.user.id, book_id=book.id)
-
-            db.session.add(track_book)
-            db.session.commit()
-            return redirect(url_for('user_books'))
-
-        except IntegrityError:
-            # We will get an Integrity Error if the user already tracks the book
-            flash("User is already tracking this book", 'danger')
-            return redirect(f"/books/{isbn}")
-
-    # If the book is not in our DB, we redirect to root route
-    else:
-        flash("The book is unavailable to track or the ISBN is incorrect.", "danger")
-        return redirect("/")
-
-
-@app.route('/books/stop-tracking/<isbn>', methods=["POST"])
-def stop_track_book(isbn):
-    """Delete user and book relation for tracking the book"""
-    # If the user is not the one in session redirect
-    if not g.user:
-        flash("Access unauthorized.", "danger")
-        return redirect("/")
-
-    book = Book.query.filter_by(isbn_10=isbn).first()
-
-    # If the book is in the DB, we let the user untrack the book
-
-    if book:
-        try:
-
-            g.user.books.remove(book)
-            db.session.commit()
-
-            return redirect(f"/books/{isbn}")
-
-        except:
-            # We will get an error if the user tries to untrack an already untracked book
-            flash("User is not tracking this book", 'danger')
-            return redirect(f"/books/{isbn}")
-
-    # If the book is not in our DB, we redirect to root route
-    else:
-        flash("The book is unavailable to track or the ISBN is incorrect.", "danger")
-        return redirect("/")
-
-#######################################################################################
-#############USER-BOOKS ROUTES ##########################################################
-#######################################################################################
-
-
-@app.route('/users/books')
-def user_books():
-    """Show basic information about the user's tracked books 
-    """
-    # If the user is not the one in session redirect
-    if not g.user:
-        flash("Access unauthorized.", "danger")
-        return redirect("/")
-
-    else:
-        return render_template('user_track_books.html', user=g.user)
-
-
-@app.route('/users/books/<isbn>/read', methods=["POST"])
-def read_unread_book(isbn):
-    """Let user select if they have read the book or not"""
-    # If the user is not the one in session redirect
-    if not g.user:
-        flash("Access unauthorized.", "danger")
-        return redirect("/")
-
-    book = Book.query.filter_by(isbn_10=isbn).first()
-
-    # If the book is in the DB, we let the user select if the book has been read or not
-
-    if book:
-
-        # query to see if there is a relation between the book and the user
-        relation = UserBook.query.filter(
-            UserBook.user_id == g.user.id, UserBook.book_id == book.id).first()
+        else:
+            g.user = None
 
-        # If the relation exist and 'read_or_not' is true, change to false
-        if relation and relation.read_or_not:
 
-            relation.read_or_not = False
-            db.session.commit()
-            return redirect("/users/books")
+@click.command("reconcile-counters")
+@with_appcontext
+def reconcile_counters_command():
+    """Recount the books' trackers and readers (run it periodically)."""
 
-        # If the relation exist and 'read_or_not' is false, change to true
-        elif relation:
-            relation.read_or_not = True
-            db.session.commit()
-            return redirect("/users/books")
+    fixed = Book.reconcile_counts()
+    db.session.commit()
+    click.echo(f"Fixed the counters of {fixed} book(s).")
 
-        # Redirect if the relation doesn't exist
-        else:
-            flash("The user isn't tracking this book.", "danger")
-        return redirect("/")
 
-    # If the book is not in our DB, we redirect to root route
-    else:
-        flash("The book is unavailable to track or the ISBN is incorrect.", "danger")
-        return redirect("/")
+@click.command("worker")
+@click.option("--concurrency", "-c", default=1, show_default=True,
+              help="Number of jobs run at the same time.")
+@click.option("--poll-interval", default=1.0, show_default=True,
+              help="Seconds to wait when there are no jobs.")
+@with_appcontext
+def worker_command(concurrency, poll_interval):
+    """Run the background jobs queued in the database."""
 
+    from jobs import work
 
-#######################################################################################
-###################USER ROUTES ##########################################################
-#######################################################################################
+    work(current_app._get_current_object(), concurrency, poll_interval)
 
-@app.route('/users/<int:user_id>')
-def user_details(user_id):
-    """Render user's details page"""
-    # If the user is not the one in session redirect
-    if not g.user:
-        flash("Access unauthorized.", "danger")
-        return redirect("/")
 
-    user = User.query.get_or_404(user_id)
+@click.command("enqueue")
+@click.argument("kind")
+@click.argument("payload", default="{}")
+@with_appcontext
+def enqueue_command(kind, payload):
+    """Queue a background job, e.g. flask enqueue backfill_overview
+    '{"date": "2022-10-02"}'."""
 
-    return render_template("users/details.html", user=user)
+    from jobs import enqueue, HANDLERS
 
+    if kind not in HANDLERS:
+        raise click.BadParameter(f"choose from {', '.join(sorted(HANDLERS))}",
+                                 param_hint="KIND")
 
-@app.route('/users/delete', methods=["POST"])
-def delete_user():
-    """Delete user."""
-    # If the user is not the one in session redirect
-    if not g.user:
-        flash("Access unauthorized.", "danger")
-        return redirect("/")
+    enqueue(kind, json.loads(payload))
+    db.session.commit()
 
-    do_logout()
 
-    # delete user from DB
-    db.session.delete(g.user)
-    db.session.commit()
+@click.command("build-assets")
+@with_appcontext
+def build_assets_command():
+    """Bundle, fingerprint and compress the static assets into static/dist
+    (commit the result)."""
 
-    return redirect("/signup")
-
-
-@app.route('/users/edit', methods=["GET", "POST"])
-def profile():
-    """Update profile for current user."""
-    # If the user is not the one in session redirect
-    if not g.user:
-        flash("Access unauthorized.", "danger")
-        return redirect("/")
-    # Data to pass to the form to be pre-filled wit the user's data
-    data = {"username": g.user.username,
-            "email": g.user.email, "image_url": g.user.image_url}
-
-    form = UserEditForm(data=data)
-
-    # If the form  has valid data and CRSF-Token
-    if form.validate_on_submit():
-        user = User.authenticate(g.user.username,
-                                 form.password.data)
-        # Change user's info to the form data ifauthentication is correct
-        if user:
-            user.username = form.username.data
-            user.email = form.email.data
-            user.image_url = form.image_url.data
-            db.session.add(user)
-            db.session.commit()
-            flash(f"{user.username}, your changes were made successfully", "success")
-            return redirect(f"/users/{user.id}")
-        # Render form if the credentials are incorrect
-        flash("Invalid credentials.", 'danger')
-
-    return render_template('users/edit.html', form=form)
-
-
-@cache.memoize(timeout=86400)
-def do_books_overview(date):
-    """Get this weeks books overview"""
-    res = requests.get(
-        f"{BASE_URL}full-overview.json",
-        params={"api-key": API_KEY,
-                "published_date": date})
-    data = res.json()
-    results = data["results"]
-    lists = results["lists"]
-
-    return lists
+    manifest = build_assets(current_app.static_folder)
+    click.echo(f"Built {len(manifest)} asset(s) in static/dist.")
@@ -0,0 +1,216 @@
+"""Bundled, fingerprinted and precompressed static assets.
+
+`flask build-assets` concatenates each bundle of BUNDLES, copies FILES,
+names every output after a hash of its content (e.g. site.3f2a9c1b7d.css)
+and writes gzip and brotli variants of the text ones to static/dist, with
+a manifest.json mapping the names used in the templates to the built
+files. The build is committed, so deploys don't need a build step; run it
+again after changing a source (test_assets checks the build is current).
+
+A built file's name changes whenever its content does, so /assets/ serves
+them with a year long immutable Cache-Control: repeat visits don't fetch,
+or even revalidate, them. In debug mode the templates get the sources
+instead, so edits show up without a build.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import (Blueprint, Response, abort, current_app, request,
+                   send_from_directory, url_for)
+
+# The stylesheets of every page, in order
+BUNDLES = {
+    "site.css": ("vendor/bootstrap-5.3.8.min.css", "stylesheets/style.css"),
+}
+# Files referenced by the templates or the bundles, as they are
+FILES = (
+    "favicon.ico",
+    "images/nytime-logo.png",
+    "images/nav-bg.png",
+    "images/signed-out-home.jpg",
+    "images/default-pic.png",
+)
+# Only these are worth compressing, the images already are
+COMPRESSED = (".css", ".js", ".svg", ".ico")
+# The variants in the order they're preferred, with their file suffix
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+DIST = "dist"
+MAX_AGE = 365 * 24 * 3600
+
+_STATIC_URL = re.compile(r"""url\(\s*["']?/static/([^"')]+)["']?\s*\)""")
+_SOURCE_MAP = re.compile(rb"/\*# sourceMappingURL=.*?\*/")
+
+assets = Blueprint("assets", __name__)
+
+
+def fingerprint(name, content):
+    """`name` with a hash of `content`: images/logo.png becomes
+    images/logo.0123456789.png."""
+
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.sha256(content).hexdigest()[:10]
+
+    return f"{stem}.{digest}{ext}"
+
+
+def bundle(static_folder, name):
+    """The sources of a bundle concatenated (without their source map
+    comments, the maps aren't shipped)."""
+
+    parts = []
+    for source in BUNDLES[name]:
+        with open(os.path.join(static_folder, source), "rb") as file:
+            parts.append(_SOURCE_MAP.sub(b"", file.read()).strip())
+
+    return b"\n".join(parts) + b"\n"
+
+
+def compress(content):
+    """The gzip and brotli variants of `content` worth keeping, by encoding."""
+
+    # brotli is only needed to build the assets, not to serve them
+    import brotli
+
+    variants = {"br": brotli.compress(content, quality=11),
+                "gzip": gzip.compress(content, 9, mtime=0)}
+
+    return {encoding: variant for encoding, variant in variants.items()
+            if len(variant) < len(content)}
+
+
+def build_assets(static_folder):
+    """Build the assets of `static_folder` into its dist directory, replacing
+    the previous build. Returns the manifest."""
+
+    dist = os.path.join(static_folder, DIST)
+    shutil.rmtree(dist, ignore_errors=True)
+
+    manifest = {}
+
+    def write(name, content):
+        built = fingerprint(name, content)
+        encodings = compress(content) if built.endswith(COMPRESSED) else {}
+
+        os.makedirs(os.path.dirname(os.path.join(dist, built)), exist_ok=True)
+        with open(os.path.join(dist, built), "wb") as file:
+            file.write(content)
+        for encoding, suffix in ENCODINGS:
+            if encoding in encodings:
+                with open(os.path.join(dist, built + suffix), "wb") as file:
+                    file.write(encodings[encoding])
+
+        manifest[name] = {"file": built, "encodings": sorted(encodings)}
+
+    # The files first, so the bundles can point to their built names
+    for name in FILES:
+        with open(os.path.join(static_folder, name), "rb") as file:
+            write(name, file.read())
+
+    def built_url(match):
+        name = match.group(1)
+        if name not in manifest:
+            return match.group(0)
+        # The bundles are at the root of dist, next to the files' directories
+        return f'url("{manifest[name]["file"]}")'
+
+    for name in BUNDLES:
+        content = bundle(static_folder, name).decode()
+        write(name, _STATIC_URL.sub(built_url, content).encode())
+
+    with open(os.path.join(dist, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+
+    return manifest
+
+
+def load_manifest(static_folder):
+    """The manifest of the build in `static_folder`, {} if there's none."""
+
+    try:
+        with open(os.path.join(static_folder, DIST, "manifest.json")) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def init_assets(app):
+    """Serve the built assets and add asset_url() to the templates."""
+
+    # The sources are used in debug mode, see asset_url
+    manifest = {} if app.debug else load_manifest(app.static_folder)
+    if not manifest and not app.debug:
+        app.logger.warning("The assets aren't built, run flask build-assets")
+
+    app.extensions['assets'] = {
+        "urls": {name: entry["file"] for name, entry in manifest.items()},
+        "encodings": {entry["file"]: entry["encodings"]
+                      for entry in manifest.values()},
+    }
+
+    app.register_blueprint(assets)
+    app.add_template_global(asset_url)
+    app.add_template_filter(static_asset)
+
+
+def asset_url(name):
+    """URL of an asset: its built file, or without a build its source (the
+    bundles are then put together on every request)."""
+
+    built = current_app.extensions['assets']["urls"].get(name)
+    if built is not None:
+        return url_for("assets.asset", filename=built)
+
+    if name in BUNDLES:
+        return url_for("assets.asset", filename=name)
+
+    return url_for("static", filename=name)
+
+
+def static_asset(url):
+    """`url`, or the URL of its asset if it's a /static/ one (e.g. the
+    users' default picture, which is stored as a URL)."""
+
+    if url and url.startswith("/static/"):
+        return asset_url(url[len("/static/"):])
+
+    return url
+
+
+@assets.route("/assets/<path:filename>")
+def asset(filename):
+    """Send a built asset, compressed if the client takes it, to be cached
+    for good."""
+
+    if filename in BUNDLES:
+        return Response(bundle(current_app.static_folder, filename),
+                        mimetype=mimetypes.guess_type(filename)[0],
+                        headers={"Cache-Control": "no-cache"})
+
+    encodings = current_app.extensions['assets']["encodings"].get(filename)
+    if encodings is None:
+        abort(404)
+
+    path, used = filename, None
+    for encoding, suffix in ENCODINGS:
+        if encoding in encodings and request.accept_encodings[encoding]:
+            path, used = filename + suffix, encoding
+            break
+
+    response = send_from_directory(
+        os.path.join(current_app.static_folder, DIST), path,
+        mimetype=mimetypes.guess_type(filename)[0], cache_timeout=MAX_AGE)
+
+    response.headers["Cache-Control"] = f"public, max-age={MAX_AGE}, immutable"
+    if encodings:
+        response.vary.add("Accept-Encoding")
+    if used:
+        response.headers["Content-Encoding"] = used
+
+    return response
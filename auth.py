@@ -0,0 +1,77 @@
+"""Login, logout and signup routes."""
+
+from flask import Blueprint, render_template, flash, redirect
+from sqlalchemy.exc import IntegrityError
+
+from forms import UserAddForm, LoginForm
+from functions import do_login, do_logout
+from models import db, User
+
+auth = Blueprint("auth", __name__)
+
+
+@auth.route('/signup', methods=["GET", "POST"])
+def signup():
+    """Handle user signup.
+
+    Create new user and add to DB. Redirect to home page.
+
+    If form not valid, present form.
+
+    If the there already is a user with that username: flash message
+    and re-present form.
+    """
+
+    form = UserAddForm()
+
+    if form.validate_on_submit():
+        try:
+            user = User.signup(
+                username=form.username.data,
+                password=form.password.data,
+                email=form.email.data,
+                image_url=form.image_url.data or User.image_url.default.arg,
+            )
+            db.session.commit()
+
+        except IntegrityError:
+            # We will get an Integrity Error if the username already exist
+            flash("Username already taken", 'danger')
+            return render_template('users/signup.html', form=form)
+
+        do_login(user)
+
+        return redirect("/")
+
+    else:
+        return render_template('users/signup.html', form=form)
+
+
+@auth.route('/login', methods=["GET", "POST"])
+def login():
+    """Handle user login."""
+
+    form = LoginForm()
+
+    if form.validate_on_submit():
+        # If authentication fails we get false and render the form again
+        user = User.authenticate(form.username.data,
+                                 form.password.data)
+        # If true we login and redirect
+        if user:
+            do_login(user)
+            flash(f"Hello, {user.username}!", "success")
+            return redirect("/")
+
+        flash("Invalid credentials.", 'danger')
+
+    return render_template('users/login.html', form=form)
+
+
+@auth.route('/logout')
+def logout():
+    """Handle logout of user."""
+
+    do_logout()
+
+    return redirect("/")
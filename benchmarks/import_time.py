@@ -0,0 +1,49 @@
+"""Measure how long it takes to import and build the app.
+
+Run it from the project root:
+
+    python benchmarks/import_time.py
+
+Each measurement runs in a fresh interpreter, like a gunicorn worker
+(without --preload) or a test run would.
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 10
+
+STEPS = {
+    "import app": "import app",
+    "create_app()": "import app; app.create_app()",
+    "first request": ("import app; a = app.create_app(); "
+                      "a.test_client().get('/login')"),
+}
+
+
+def measure(code):
+    """Median wall time (ms) of running `code` in a fresh interpreter."""
+
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        times.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(times)
+
+
+def main():
+    baseline = measure("pass")
+    print(f"{'interpreter':<15} {baseline:8.1f} ms")
+
+    for name, code in STEPS.items():
+        print(f"{name:<15} {measure(code) - baseline:8.1f} ms")
+
+    print("\nFor a per-module breakdown run: python -X importtime -c 'import app'")
+
+
+if __name__ == "__main__":
+    main()
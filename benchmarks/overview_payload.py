@@ -0,0 +1,102 @@
+"""Compare the raw overview JSON with its compact cached form.
+
+Run it from the project root:
+
+    python benchmarks/overview_payload.py
+
+Uses a synthetic overview shaped like the NYT full-overview response
+(18 lists of 15 books, with the fields the API returns), so no network
+or API key is needed.
+"""
+
+import os
+import pickle
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from isbn import isbn10_to_13, isbn13_to_10  # noqa: E402
+from overview import compact_overview, load_overview  # noqa: E402
+
+LISTS = 18
+BOOKS_PER_LIST = 15
+RUNS = 200
+
+
+def fake_results():
+    """Synthetic "results" of a full-overview response."""
+
+    def book(list_index, rank):
+        # A valid ISBN-10 (invalid ones are dropped from the payload)
+        isbn13 = isbn10_to_13(f"{list_index:03d}{rank:06d}")
+        isbn = isbn13_to_10(isbn13)
+        return {
+            "age_group": "", "amazon_product_url": f"https://www.amazon.com/dp/{isbn}",
+            "article_chapter_link": "", "author": f"Author {rank % 7}",
+            "book_image": f"https://storage.googleapis.com/du-prd/books/images/{isbn}.jpg",
+            "book_image_width": 331, "book_image_height": 500,
+            "book_review_link": "", "book_uri": f"nyt://book/{isbn}",
+            "contributor": f"by Author {rank % 7}", "contributor_note": "",
+            "created_date": "2022-10-19 22:10:24",
+            "description": "A description of the book that is a sentence or two long. " * 2,
+            "first_chapter_link": "", "price": "0.00",
+            "primary_isbn10": isbn, "primary_isbn13": isbn13,
+            "publisher": "Publisher", "rank": rank, "rank_last_week": rank + 1,
+            "sunday_review_link": "", "title": f"TITLE NUMBER {list_index} {rank}",
+            "updated_date": "2022-10-19 22:14:44", "weeks_on_list": rank * 2,
+            "isbns": [{"isbn10": isbn, "isbn13": isbn13}] * 3,
+            "buy_links": [{"name": name, "url": f"https://{name.lower()}.example/{isbn}"}
+                          for name in ("Amazon", "Apple Books", "Barnes and Noble",
+                                       "Books-A-Million", "Bookshop", "IndieBound")],
+        }
+
+    return {
+        "bestsellers_date": "2022-10-15", "published_date": "2022-10-30",
+        "published_date_description": "latest",
+        "lists": [{
+            "list_id": i, "list_name": f"List {i}", "list_name_encoded": f"list-{i}",
+            "display_name": f"List {i}", "updated": "WEEKLY",
+            "list_image": None, "list_image_width": None, "list_image_height": None,
+            "books": [book(i, rank) for rank in range(1, BOOKS_PER_LIST + 1)],
+        } for i in range(LISTS)],
+    }
+
+
+def memory_of(build):
+    """Bytes allocated by the object `build()` returns."""
+
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def report(name, value, pickled):
+    dumps = timeit.timeit(lambda: pickle.dumps(value), number=RUNS) / RUNS
+    loads = timeit.timeit(lambda: pickle.loads(pickled), number=RUNS) / RUNS
+    print(f"{name:<10} {len(pickled) / 1024:10.1f} KiB "
+          f"{dumps * 1e6:10.0f} us {loads * 1e6:10.0f} us")
+
+
+def main():
+    results = fake_results()
+    raw = results["lists"]
+    payload = compact_overview(results)
+
+    print(f"{'':<10} {'pickled':>14} {'dumps':>13} {'loads':>13}")
+    report("raw", raw, pickle.dumps(raw))
+    report("compact", payload, pickle.dumps(payload))
+
+    # What each worker keeps / rebuilds per request
+    raw_pickle = pickle.dumps(raw)
+    payload_pickle = pickle.dumps(payload)
+    print(f"\nin memory: raw {memory_of(lambda: pickle.loads(raw_pickle)) / 1024:.1f} KiB, "
+          f"compact {memory_of(lambda: load_overview(pickle.loads(payload_pickle))) / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
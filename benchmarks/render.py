@@ -0,0 +1,137 @@
+"""Measure the time to first byte of the large pages and the templates'
+warm-up.
+
+Run it from the project root:
+
+    python benchmarks/render.py
+
+TTFB compares home.html and user_track_books.html rendered in one piece
+(render_template) with streamed (render_streamed), on synthetic data
+(no database or network needed). Warm-up compiles every template in a
+fresh interpreter, like a new worker, with an empty and with a filled
+Jinja bytecode cache.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import g, render_template  # noqa: E402
+
+from app import create_app  # noqa: E402
+from functions import render_streamed  # noqa: E402
+from overview import OverviewBook, OverviewList  # noqa: E402
+
+LISTS = 18
+BOOKS_PER_LIST = 15
+TRACKED_BOOKS = 500
+RUNS = 50
+
+WARM_UP = ("import sys, time; sys.path.insert(0, '.'); "
+           "from app import create_app, warm_templates; "
+           "app = create_app(); start = time.perf_counter(); "
+           "warm_templates(app); print(time.perf_counter() - start)")
+
+
+def home_context():
+    """Synthetic context of home.html."""
+
+    lists = [OverviewList(f"List {i}", [
+        OverviewBook(f"TITLE NUMBER {i} {rank}", f"Author {rank % 7}", rank,
+                     f"https://example.com/{i}/{rank}.jpg", f"{i:03d}{rank:07d}")
+        for rank in range(1, BOOKS_PER_LIST + 1)]) for i in range(LISTS)]
+
+    movements = {lst.list_name: {rank: (rank % 5 - 2, rank == 3)
+                                 for rank in range(1, BOOKS_PER_LIST + 1)}
+                 for lst in lists}
+
+    tracked = {book.primary_isbn10: bool(book.rank % 2)
+               for lst in lists[:3] for book in lst.books}
+
+    return dict(lists=lists, movements=movements, tracked=tracked)
+
+
+def tracked_books_context(user):
+    """Synthetic context of user_track_books.html."""
+
+    user.books = [SimpleNamespace(
+        isbn=f"{i:010d}", isbn_10=f"{i:010d}", isbn_13=f"978{i:010d}",
+        title=f"Title {i}",
+        author=f"Author {i % 7}",
+        description="A description of the book that is a sentence or two long. " * 2,
+        users_books=[SimpleNamespace(user_id=user.id, read_or_not=bool(i % 2))])
+        for i in range(TRACKED_BOOKS)]
+
+    return dict(user=user, changes={})
+
+
+def ttfb(render):
+    """Median (first chunk, whole page) times in ms of `render()`'s
+    response."""
+
+    first, total = [], []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        response = render()
+        chunks = iter(response.response)
+        next(chunks)
+        first.append((time.perf_counter() - start) * 1000)
+        for _ in chunks:
+            pass
+        total.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(first), statistics.median(total)
+
+
+def warm_up(filled):
+    """Median ms to compile every template in a fresh interpreter, with a
+    `filled` or an empty bytecode cache."""
+
+    def run(cache_dir):
+        env = dict(os.environ, JINJA_BYTECODE_CACHE_DIR=cache_dir)
+        result = subprocess.run([sys.executable, "-c", WARM_UP], env=env,
+                                check=True, capture_output=True, text=True)
+        return float(result.stdout) * 1000
+
+    times = []
+    with tempfile.TemporaryDirectory() as root:
+        if filled:
+            run(root)
+
+        for _ in range(5):
+            times.append(run(root if filled else tempfile.mkdtemp(dir=root)))
+
+    return statistics.median(times)
+
+
+def main():
+    app = create_app({"STREAM_TEMPLATES": True})
+    user = SimpleNamespace(id=1, username="reader", image_url="")
+
+    print(f"{'page':<25} {'mode':<9} {'first byte':>10} {'whole page':>10}")
+
+    for template, context in (("home.html", home_context()),
+                              ("user_track_books.html",
+                               tracked_books_context(user))):
+        for mode, render in (
+                ("buffered", lambda: app.make_response(
+                    render_template(template, **context))),
+                ("streamed", lambda: render_streamed(template, **context))):
+            with app.test_request_context():
+                g.user = user
+                first, total = ttfb(render)
+
+            print(f"{template:<25} {mode:<9} {first:8.2f} ms {total:8.2f} ms")
+
+    print(f"\nTemplate warm-up, empty bytecode cache  {warm_up(False):8.1f} ms")
+    print(f"Template warm-up, filled bytecode cache {warm_up(True):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Time the weekly diff against a synthetic 1M-row users_books table.
+
+Run it from the project root against a scratch database (its tables are
+dropped and recreated):
+
+    createdb nyt_best_sellers_bench
+    python benchmarks/weekly_diff.py
+
+Another scratch database can be given with BENCH_DATABASE_URL. DATABASE_URL
+is ignored on purpose, it usually points to a real database.
+"""
+
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+from app import create_app  # noqa: E402
+from history import diff_lists  # noqa: E402
+from models import db, BookChange, UserBookChange  # noqa: E402
+
+BENCH_DATABASE_URL = os.environ.get(
+    'BENCH_DATABASE_URL', "postgresql:///nyt_best_sellers_bench")
+
+USERS = 100_000
+BOOKS = 20_000
+BOOKS_PER_USER = 10  # USERS * BOOKS_PER_USER rows in users_books
+LISTS = 18
+BOOKS_PER_LIST = 15
+LAST_WEEK = datetime.date(2022, 10, 23)
+THIS_WEEK = datetime.date(2022, 10, 30)
+
+
+def timed(name, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{name:<40} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    return result
+
+
+def populate():
+    """Fill the tables with generate_series, it's much faster than the ORM."""
+
+    db.session.execute(text("""
+        INSERT INTO users (id, username, email, password)
+        SELECT i, 'user' || i, 'user' || i || '@test.com', 'x'
+        FROM generate_series(1, :users) AS i
+    """), {"users": USERS})
+    db.session.execute(text("""
+        INSERT INTO books (id, title, description, author, publisher, isbn_13)
+        SELECT i, 'Title ' || i, '', 'Author', 'Publisher', '978' || lpad(i::text, 10, '0')
+        FROM generate_series(1, :books) AS i
+    """), {"books": BOOKS})
+    # Each user tracks BOOKS_PER_USER different books
+    db.session.execute(text("""
+        INSERT INTO users_books (user_id, book_id, read_or_not)
+        SELECT u, (u * 37 + k * 2003) % :books + 1, false
+        FROM generate_series(1, :users) AS u,
+             generate_series(0, :per_user - 1) AS k
+    """), {"users": USERS, "books": BOOKS, "per_user": BOOKS_PER_USER})
+    db.session.commit()
+    db.session.execute(text("ANALYZE"))
+
+
+def weekly_lists(shift):
+    """ISBNs in rank order of each list; `shift` reshuffles them a bit."""
+
+    return {
+        f"List {i}": [
+            f"978{(i * BOOKS_PER_LIST + (rank + shift) % (BOOKS_PER_LIST + 3)) % BOOKS + 1:010d}"
+            for rank in range(BOOKS_PER_LIST)]
+        for i in range(LISTS)}
+
+
+def main():
+    # Populating takes longer than the default statement timeout
+    app = create_app({"SQLALCHEMY_DATABASE_URI": BENCH_DATABASE_URL,
+                      "DATABASE_STATEMENT_TIMEOUT": 0})
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        timed(f"populate ({USERS * BOOKS_PER_USER:,} users_books)", populate)
+
+        previous, current = weekly_lists(0), weekly_lists(2)
+
+        def diff():
+            return [dict(published_date=THIS_WEEK, list_name=name,
+                         isbn_13=isbn_13, change=change, rank=rank,
+                         previous_rank=previous_rank)
+                    for name in current
+                    for isbn_13, change, rank, previous_rank
+                    in diff_lists(previous[name], current[name])]
+
+        changes = timed(f"diff {LISTS} lists", diff)
+        print(f"{'':<40} {len(changes):>10} changes")
+
+        def materialize():
+            db.session.bulk_insert_mappings(BookChange, changes)
+            BookChange.notify_trackers(THIS_WEEK)
+            db.session.commit()
+
+        timed("materialize per-user changes", materialize)
+        print(f"{'':<40} {UserBookChange.query.count():>10} user rows")
+
+        timed("read one user's changes",
+              lambda: BookChange.latest_for_user(37))
+
+
+if __name__ == "__main__":
+    main()
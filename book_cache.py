@@ -0,0 +1,190 @@
+"""In-process cache of the books' metadata, keyed by ISBN-13.
+
+A book's title, author, etc. don't change once it's in our DB, so each
+worker keeps the most used ones in memory (and in the shared cache) and
+the book pages skip the database for them.
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, or_
+
+from functions import cache
+from isbn import normalize_isbn
+from models import Book, RoutingSession
+
+
+class BookRecord(namedtuple(
+        "BookRecord",
+        ["id", "title", "author", "description", "publisher", "isbn_10",
+         "isbn_13"])):
+    """What the pages need to know about a book (no relationships, no
+    counters)"""
+
+    __slots__ = ()
+
+    @property
+    def isbn(self):
+        """The ISBN used in the book's URLs"""
+
+        return self.isbn_10 or self.isbn_13
+
+
+# Entries expire so a change made through another worker is picked up
+BOOK_CACHE_SIZE = 1024
+BOOK_CACHE_TTL = 3600
+
+
+class LRUCache:
+    """A thread safe, bounded mapping that drops its least recently used
+    entries first, and entries older than `ttl` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get the value of `key`, or None."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_books = LRUCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL)
+
+
+def _shared_key(isbn):
+    return f"book:{isbn}"
+
+
+def _use_shared():
+    """Whether to use the shared cache too (the models can also be used
+    outside of an app context, e.g. from scripts)."""
+
+    return has_app_context() and current_app.config.get('BOOK_CACHE_SHARED')
+
+
+def get_book(isbn):
+    """Get the BookRecord of the book with this ISBN (10 or 13, hyphens
+    allowed), or None if it's not in our DB or isn't a valid ISBN.
+
+    Looks in this worker's LRU, then in the shared cache (if
+    BOOK_CACHE_SHARED is set, which only makes sense when the cache isn't
+    per process), then in the DB.
+    """
+
+    isbns = normalize_isbn(isbn)
+    if isbns is None:
+        return None
+
+    isbn_10, isbn_13 = isbns
+
+    record = _books.get(isbn_13)
+    if record is not None:
+        return record
+
+    shared = _use_shared()
+    record = cache.get(_shared_key(isbn_13)) if shared else None
+
+    if record is None:
+        # Books added before the isbn_13 column only have their ISBN-10
+        # (and 979 ISBN-13s have no ISBN-10)
+        criteria = [Book.isbn_13 == isbn_13]
+        if isbn_10:
+            criteria.append(Book.isbn_10 == isbn_10)
+
+        book = Book.query.filter(or_(*criteria)).first()
+        if book is None:
+            return None
+
+        record = BookRecord(book.id, book.title, book.author,
+                            book.description, book.publisher, book.isbn_10,
+                            book.isbn_13)
+        if shared:
+            cache.set(_shared_key(isbn_13), tuple(record),
+                      timeout=BOOK_CACHE_TTL)
+
+    else:
+        # The shared cache holds plain tuples
+        record = BookRecord._make(record)
+
+    _books.set(isbn_13, record)
+    return record
+
+
+def invalidate_book(isbn):
+    """Forget what we know about a book (call it when the book changes)."""
+
+    isbns = normalize_isbn(isbn)
+    if isbns is None:
+        return
+
+    _, isbn_13 = isbns
+    _books.pop(isbn_13)
+    if _use_shared():
+        cache.delete(_shared_key(isbn_13))
+
+
+@event.listens_for(Book, "after_insert")
+@event.listens_for(Book, "after_update")
+@event.listens_for(Book, "after_delete")
+def book_changed(mapper, connection, book):
+    """Invalidate a book when it is upserted or deleted through the ORM."""
+
+    invalidate_book(book.isbn_13 or book.isbn_10)
+
+
+@event.listens_for(RoutingSession, "after_bulk_delete")
+def books_deleted(delete_context):
+    """Bulk deletes don't say which books went away, forget them all (the
+    shared cache entries expire after BOOK_CACHE_TTL)."""
+
+    if delete_context.mapper.class_ is Book:
+        _books.clear()
+
+
+@event.listens_for(RoutingSession, "after_bulk_update")
+def books_updated(update_context):
+    """Bulk updates don't say which books changed, forget them all, unless
+    only the counters changed (see Book.change_counts)."""
+
+    if update_context.mapper.class_ is not Book:
+        return
+
+    changed = {getattr(column, "key", column) for column in update_context.values}
+    if not changed <= {"trackers_count", "readers_count"}:
+        _books.clear()
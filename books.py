@@ -0,0 +1,220 @@
+"""Best sellers overview and book routes."""
+
+import datetime
+
+from flask import Blueprint, render_template, flash, redirect, g, url_for
+from sqlalchemy.exc import IntegrityError
+
+from book_cache import get_book
+from functions import (do_books_overview, do_overview_movements, nyt_get,
+                       read_only, redirect_back, render_streamed, top_books)
+from isbn import normalize_isbn
+from models import (db, Book, UserBook, FeedEntry, ListSnapshot,
+                    RankHistory)
+from replay import MissingRecording
+
+books = Blueprint("books", __name__)
+
+
+@books.route('/')
+def homepage():
+    """Show homepage:
+
+    - anon users: no books
+    - logged in: current week's best sellers
+    """
+    # If the user is not the one in session render the anonym root route
+    if g.user:
+
+        unformated_date = datetime.datetime.now()
+        date = unformated_date.strftime("%Y-%m-%d")
+        overview = do_books_overview(date)
+        movements = do_overview_movements(overview.published_date, date)
+
+        # One query for the read status of all the user's books, so the
+        # cards can show which ones are tracked (by either ISBN)
+        tracked = {}
+        for isbn_10, isbn_13, read_or_not in (
+                db.session.query(Book.isbn_10, Book.isbn_13, UserBook.read_or_not)
+                .join(UserBook)
+                .filter(UserBook.user_id == g.user.id)):
+            tracked[isbn_10] = tracked[isbn_13] = read_or_not
+        tracked.pop(None, None)
+
+        return render_streamed('home.html', lists=overview.lists,
+                               movements=movements, tracked=tracked)
+
+    else:
+        return render_template('home-anon.html')
+
+
+@books.route('/books/popular')
+@read_only
+def popular_books():
+    """Show the books our users track and read the most"""
+    # If the user is not the one in session redirect
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    return render_template('popular.html',
+                           most_tracked=top_books("trackers_count"),
+                           most_read=top_books("readers_count"))
+
+
+@books.route('/books/<isbn>')
+@read_only
+def show_book(isbn):
+    """Show book acording to the ISBN"""
+    # If the user is not the one in session redirect
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    # Malformed ISBNs never reach the DB or the API
+    if not normalize_isbn(isbn):
+        flash("The ISBN is incorrect.", "danger")
+        return redirect("/")
+
+    # If the book is in our DB, we don't make a request and retrieve the information from our databse
+
+    book = get_book(isbn)
+
+    if not book and g.use_replica:
+        # The replica may be lagging behind, check the primary before
+        # spending an API call on a book we may already have
+        g.use_replica = False
+        book = get_book(isbn)
+
+    # If the book is not in our DB, we retieve the data from the API
+    if not book:
+        book = fetch_book(isbn)
+
+    if book:
+        tracking = UserBook.query.get((g.user.id, book.id)) is not None
+        histories = RankHistory.for_book(book)
+        # Movements are only shown for the lists' current week
+        latest = ListSnapshot.latest_dates(
+            [history.list_name for history in histories])
+        return render_template('book_show.html', book=book, tracking=tracking,
+                               histories=histories, latest=latest)
+
+    # The API is currently throwing empty results when looking for particular books with ISBN_10
+    else:
+        flash("Book's details curently unavailable.", "danger")
+        return redirect("/")
+
+
+def fetch_book(isbn):
+    """Get a book from the API and add it into our DB.
+
+    Returns its BookRecord, or None if the API doesn't know the book.
+    """
+
+    isbn_10, isbn_13 = normalize_isbn(isbn)
+
+    try:
+        data = nyt_get("best-sellers/history.json", isbn=isbn_13)
+
+    except MissingRecording:
+        # Replaying the API (NYT_MODE=replay) and nobody recorded this book
+        return None
+
+    try:
+        # API response is a list, therefore we get the first book even when it's only one book in the list
+        book = data["results"][0]
+
+    except IndexError:
+        return None
+
+    # The ISBNs are already given from the url
+    Book.add_book(title=book["title"],
+                  author=book["author"],
+                  description=book["description"],
+                  publisher=book["publisher"],
+                  isbn_10=isbn_10,
+                  isbn_13=isbn_13)
+
+    db.session.commit()
+
+    return get_book(isbn_13)
+
+
+@books.route('/books/<isbn>/track', methods=["POST"])
+def track_book(isbn):
+    """Make current user and book relation for tracking the book"""
+    # If the user is not the one in session redirect
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    # Malformed ISBNs never reach the DB or the API
+    if not normalize_isbn(isbn):
+        flash("The ISBN is incorrect.", "danger")
+        return redirect("/")
+
+    # Books tracked from the overview may not be in our DB yet
+    book = get_book(isbn) or fetch_book(isbn)
+
+    # If the book is in the DB, we let the user track the book
+
+    if book:
+        try:
+
+            track_book = UserBook(user_id=g.user.id, book_id=book.id)
+
+            db.session.add(track_book)
+            Book.change_counts(book.id, trackers=1)
+            FeedEntry.fan_out(g.user.id, book.id, "tracked")
+            db.session.commit()
+            return redirect_back(url_for('users.user_books'))
+
+        except IntegrityError:
+            # We will get an Integrity Error if the user already tracks the book
+            db.session.rollback()
+            flash("User is already tracking this book", 'danger')
+            return redirect(f"/books/{isbn}")
+
+    # If the book is not in our DB, we redirect to root route
+    else:
+        flash("The book is unavailable to track or the ISBN is incorrect.", "danger")
+        return redirect("/")
+
+
+@books.route('/books/stop-tracking/<isbn>', methods=["POST"])
+def stop_track_book(isbn):
+    """Delete user and book relation for tracking the book"""
+    # If the user is not the one in session redirect
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    # Malformed ISBNs never reach the DB or the API
+    if not normalize_isbn(isbn):
+        flash("The ISBN is incorrect.", "danger")
+        return redirect("/")
+
+    book = get_book(isbn)
+
+    # If the book is in the DB, we let the user untrack the book
+
+    if book:
+        relation = UserBook.query.get((g.user.id, book.id))
+
+        if relation:
+            Book.change_counts(book.id, trackers=-1,
+                               readers=-1 if relation.read_or_not else 0)
+            db.session.delete(relation)
+            db.session.commit()
+
+            return redirect_back(f"/books/{isbn}")
+
+        else:
+            # The user tried to untrack an already untracked book
+            flash("User is not tracking this book", 'danger')
+            return redirect(f"/books/{isbn}")
+
+    # If the book is not in our DB, we redirect to root route
+    else:
+        flash("The book is unavailable to track or the ISBN is incorrect.", "danger")
+        return redirect("/")
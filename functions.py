@@ -1,16 +1,190 @@
 """File to separate functionality from view's app"""
 
-from app import session
+import datetime
+
+from flask import (session, current_app, request, redirect, render_template,
+                   get_flashed_messages, stream_with_context, Response)
+
+from flask_caching import Cache
+
+from models import db, Book, OverviewSnapshot
+from overview import compact_overview, load_overview
+from tracing import span, traced_iter
+
+CURR_USER_KEY = "curr_user"
+BASE_URL = "https://api.nytimes.com/svc/books/v3/lists/"
+# Template events buffered before a streamed page sends a chunk
+STREAM_BUFFER = 20
+# The worker refreshes the stored overview hourly, past this the homepage
+# fetches it itself
+STORED_OVERVIEW_MAX_AGE = datetime.timedelta(hours=6)
+
+cache = Cache()
 
 
 def do_login(user):
     """Log in user. from session"""
 
-    session["curr_user"] = user.id
+    session[CURR_USER_KEY] = user.id
 
 
 def do_logout():
     """Logout user from session."""
 
-    if "curr_user" in session:
-        del session["curr_user"]
+    if CURR_USER_KEY in session:
+        del session[CURR_USER_KEY]
+
+
+def redirect_back(default):
+    """Redirect to the form's "next" page (so inline buttons can send the
+    user back where they were) or to `default`."""
+
+    target = request.form.get("next", "")
+
+    # Only follow local paths, not other sites
+    if not target.startswith("/") or target.startswith("//"):
+        target = default
+
+    return redirect(target)
+
+
+def render_streamed(template_name, **context):
+    """Render a large page, sending it to the client while it renders.
+
+    In debug mode (or with STREAM_TEMPLATES off) the page is rendered as
+    usual, since an error while streaming comes after the headers were
+    sent and the debugger couldn't show it.
+    """
+
+    app = current_app._get_current_object()
+
+    if app.debug or not app.config['STREAM_TEMPLATES']:
+        return render_template(template_name, **context)
+
+    # The session cookie is sent before the template runs, so take the
+    # flashed messages out of it now (base.html gets them from the request)
+    get_flashed_messages(with_categories=True)
+
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(STREAM_BUFFER)
+
+    return Response(stream_with_context(
+        traced_iter("render", stream, template=template_name, streamed=True)))
+
+
+def read_only(view):
+    """Mark a view as read only so its queries can go to the read replica."""
+
+    view.read_only = True
+    return view
+
+
+def nyt_get(path, **params):
+    """Make a GET request to the NY Times Books API and return the JSON
+    (or the recorded JSON in NYT_MODE=replay, see replay.py)."""
+
+    mode = current_app.config['NYT_MODE']
+    recordings = current_app.extensions['nyt_recordings']
+
+    if mode == "replay":
+        with span("nyt", path=path, replayed=True):
+            return recordings.get(path, params)
+
+    # requests is slow to import and only needed on a cache miss
+    import requests
+
+    params["api-key"] = current_app.config['NYT_API_KEY']
+
+    with span("nyt", path=path) as current:
+        res = requests.get(f"{BASE_URL}{path}", params=params)
+        current.set("status", res.status_code)
+
+    data = res.json()
+    if mode == "record":
+        recordings.put(path, params, data)
+
+    return data
+
+
+@cache.memoize(timeout=86400)
+def fetch_books_overview(date):
+    """Get this weeks books overview, in its compact cacheable form"""
+    from jobs import enqueue
+
+    data = nyt_get("full-overview.json", published_date=date)
+    results = data["results"]
+    payload = compact_overview(results)
+
+    # Store the listed books, so their pages never need the API
+    Book.add_listed_books(results["lists"])
+
+    # The worker adds it to the rank history, once per publication
+    enqueue("record_snapshot", {"payload": payload},
+            dedupe_key=f"record_snapshot:{results['published_date']}")
+    db.session.commit()
+
+    return payload
+
+
+@cache.memoize(timeout=300)
+def stored_overview():
+    """The payload of the overview stored by the worker's refresh_overview
+    job, or None if it hasn't stored one lately."""
+
+    stored = OverviewSnapshot.latest()
+    if stored is None or (datetime.datetime.utcnow() - stored.fetched_at
+                          > STORED_OVERVIEW_MAX_AGE):
+        return None
+
+    return stored.payload
+
+
+def do_books_overview(date):
+    """Get this weeks books overview"""
+    payload = stored_overview()
+    overview = load_overview(payload) if payload else None
+
+    if overview is None:
+        # No worker running (or not lately), fetch it from the API
+        overview = load_overview(fetch_books_overview(date))
+
+    if overview is None:
+        # Cached by a previous version of the app, fetch it again
+        cache.delete_memoized(fetch_books_overview, date)
+        overview = load_overview(fetch_books_overview(date))
+
+    return overview
+
+
+@cache.memoize(timeout=86400)
+def do_overview_movements(published_date, date):
+    """Get how this weeks books moved since last week (cached per
+    publication, so a newer overview gets its own movements)"""
+    # numpy is only needed here, keep it out of the app's startup
+    from history import overview_movements
+
+    return overview_movements(do_books_overview(date))
+
+
+@cache.memoize(timeout=300)
+def top_books(counter, limit=10):
+    """Get the `limit` books with the highest `counter` (trackers_count or
+    readers_count).
+
+    The counters are indexed with the id that breaks the ties (the newest
+    book first), so this reads `limit` rows whatever the size of the tables;
+    the result is cached for a few minutes on top of that.
+    """
+
+    column = getattr(Book, counter)
+    rows = (Book.query
+            .with_entities(Book.title, Book.author,
+                           db.func.coalesce(Book.isbn_10, Book.isbn_13),
+                           column)
+            .filter(column > 0)
+            .order_by(column.desc(), Book.id.desc())
+            .limit(limit)
+            .all())
+
+    return [tuple(row) for row in rows]
@@ -0,0 +1,24 @@
+"""Gunicorn settings (picked up automatically from the working directory)."""
+
+import os
+
+# Build the app once in the master; workers are forked with it already
+# imported, which makes spawning them much faster
+preload_app = True
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+
+
+def when_ready(server):
+    """Compile the templates in the master, before the workers are forked."""
+
+    from app import warm_templates
+
+    warm_templates(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    """Don't share database connections opened before the fork."""
+
+    from models import dispose_engines
+
+    dispose_engines(server.app.wsgi())
@@ -0,0 +1,141 @@
+"""Weekly rank history of the books on the best sellers lists."""
+
+import datetime
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+
+from models import db, ListSnapshot, RankHistory, BookChange
+
+
+def rank_movements(previous, current):
+    """Compare two weekly snapshots of a list (ISBNs in rank order, with
+    "" for the books that have none).
+
+    Returns an array aligned with `current` holding how many places each
+    book moved up since `previous` (negative if it went down), and a
+    boolean array telling which books are new on the list.
+    """
+
+    previous = np.asarray(previous, dtype=str)
+    current = np.asarray(current, dtype=str)
+    current_ranks = np.arange(1, len(current) + 1)
+
+    if not len(previous):
+        return np.zeros(len(current), dtype=int), np.ones(len(current), dtype=bool)
+
+    # Find each current ISBN in the previous snapshot with one binary search
+    order = np.argsort(previous)
+    positions = np.searchsorted(previous, current, sorter=order)
+    positions = np.minimum(positions, len(previous) - 1)
+    found = previous[order[positions]] == current
+    previous_ranks = order[positions] + 1
+
+    # Books without an ISBN can't be followed from week to week
+    found &= current != ""
+
+    movements = np.where(found, previous_ranks - current_ranks, 0)
+
+    return movements, ~found
+
+
+def diff_lists(previous, current):
+    """Compare two weekly snapshots of a list and return what changed, as
+    (isbn_13, change, rank, previous_rank) tuples where change is
+    "entered", "left" or "moved"."""
+
+    previous = np.asarray(previous, dtype=str)
+    current = np.asarray(current, dtype=str)
+    movements, new = rank_movements(previous, current)
+    ranks = np.arange(1, len(current) + 1)
+
+    entered = new & (current != "")
+    moved = movements != 0
+    left = ~np.isin(previous, current) & (previous != "")
+
+    changes = [(isbn, "entered", int(rank), None)
+               for isbn, rank in zip(current[entered], ranks[entered])]
+    changes += [(isbn, "moved", int(rank), int(rank + movement))
+                for isbn, rank, movement
+                in zip(current[moved], ranks[moved], movements[moved])]
+    changes += [(isbn, "left", None, int(rank))
+                for isbn, rank in zip(previous[left], np.flatnonzero(left) + 1)]
+
+    return changes
+
+
+def overview_movements(overview):
+    """Movement of every book of the overview since the previous week.
+
+    Returns {list_name: {rank: (movement, is_new)}}. Lists without a
+    previous snapshot are left out.
+    """
+
+    published_date = datetime.date.fromisoformat(overview.published_date)
+    previous = {snapshot.list_name: snapshot.isbns
+                for snapshot in ListSnapshot.previous_snapshots(published_date)}
+
+    result = {}
+    for lst in overview.lists:
+        if lst.list_name not in previous:
+            continue
+
+        books = sorted(lst.books, key=lambda book: book.rank)
+        movements, new = rank_movements(
+            previous[lst.list_name], [book.primary_isbn13 or "" for book in books])
+        result[lst.list_name] = {
+            book.rank: (movement, is_new) for book, movement, is_new
+            in zip(books, movements.tolist(), new.tolist())}
+
+    return result
+
+
+def record_snapshot(overview):
+    """Store the overview's lists as this week's snapshots, append each
+    book's rank to its history and record what changed since last week
+    for the users tracking the books.
+
+    Does nothing for lists already recorded for that publication date, so
+    it is safe to call on every overview fetch.
+    """
+
+    published_date = datetime.date.fromisoformat(overview.published_date)
+    recorded = {snapshot.list_name for snapshot in
+                ListSnapshot.query.filter_by(published_date=published_date)}
+    previous = {snapshot.list_name: snapshot.isbns
+                for snapshot in ListSnapshot.previous_snapshots(published_date)}
+    changes = []
+
+    for lst in overview.lists:
+        if lst.list_name in recorded:
+            continue
+
+        books = sorted(lst.books, key=lambda book: book.rank)
+        isbns = [book.primary_isbn13 or "" for book in books]
+        ranks = {book.primary_isbn13: book.rank
+                 for book in books if book.primary_isbn13}
+
+        db.session.add(ListSnapshot(list_name=lst.list_name,
+                                    published_date=published_date,
+                                    isbns=isbns))
+        RankHistory.append(lst.list_name, published_date, ranks)
+
+        # The first snapshot of a list has nothing to compare with
+        if lst.list_name in previous:
+            changes += [
+                dict(published_date=published_date, list_name=lst.list_name,
+                     isbn_13=isbn_13, change=change, rank=rank,
+                     previous_rank=previous_rank)
+                for isbn_13, change, rank, previous_rank
+                in diff_lists(previous[lst.list_name], isbns)]
+
+    if changes:
+        db.session.bulk_insert_mappings(BookChange, changes)
+        BookChange.notify_trackers(published_date)
+
+    try:
+        db.session.commit()
+
+    except IntegrityError:
+        # Another worker recorded the same week at the same time
+        db.session.rollback()
@@ -0,0 +1,91 @@
+"""ISBN-10 and ISBN-13 validation and conversion.
+
+Checked locally so malformed ISBNs (typos, scrapers...) never reach the
+database or the NY Times API.
+"""
+
+import re
+
+_SEPARATORS = re.compile(r"[\s-]")
+# ASCII digits only: str.isdigit() also takes e.g. "²" or Arabic-Indic digits
+_ISBN10 = re.compile(r"[0-9]{9}[0-9X]")
+_ISBN13 = re.compile(r"97[89][0-9]{10}")
+
+
+def clean_isbn(value):
+    """Drop the hyphens and spaces of an ISBN and upper case its "x"."""
+
+    return _SEPARATORS.sub("", str(value)).upper()
+
+
+def is_isbn10(value):
+    """Whether `value` (cleaned) is an ISBN-10 with a valid check digit.
+
+    The digits weighted 10 down to 1 must add up to a multiple of 11, the
+    last one may be an "X" standing for 10.
+    """
+
+    if not _ISBN10.fullmatch(value):
+        return False
+
+    check = 10 if value[9] == "X" else int(value[9])
+
+    total = sum((10 - i) * int(digit) for i, digit in enumerate(value[:9]))
+    return (total + check) % 11 == 0
+
+
+def is_isbn13(value):
+    """Whether `value` (cleaned) is an ISBN-13 with a valid check digit.
+
+    The digits weighted alternately 1 and 3 must add up to a multiple of 10.
+    """
+
+    if not _ISBN13.fullmatch(value):
+        return False
+
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(value))
+    return total % 10 == 0
+
+
+def isbn10_to_13(isbn_10):
+    """Convert a valid ISBN-10 to its ISBN-13 (978 prefix)."""
+
+    stem = "978" + isbn_10[:9]
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(stem))
+
+    return stem + str(-total % 10)
+
+
+def isbn13_to_10(isbn_13):
+    """Convert a valid ISBN-13 to its ISBN-10, or None for the 979 ones
+    (they have no ISBN-10)."""
+
+    if not isbn_13.startswith("978"):
+        return None
+
+    stem = isbn_13[3:12]
+    total = sum((10 - i) * int(digit) for i, digit in enumerate(stem))
+    check = -total % 11
+
+    return stem + ("X" if check == 10 else str(check))
+
+
+def normalize_isbn(value):
+    """Turn an ISBN-10 or ISBN-13 in any format into (isbn_10, isbn_13).
+
+    isbn_10 is None for the ISBN-13s without one. Returns None if `value`
+    isn't a valid ISBN.
+    """
+
+    if not value:
+        return None
+
+    value = clean_isbn(value)
+
+    if is_isbn10(value):
+        return value, isbn10_to_13(value)
+
+    if is_isbn13(value):
+        return isbn13_to_10(value), value
+
+    return None
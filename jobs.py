@@ -0,0 +1,271 @@
+"""Background jobs, queued in the database and run by `flask worker`.
+
+Jobs are rows of the jobs table. Workers pick them with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of them can run side by
+side without a broker. Failed jobs are retried with exponential backoff.
+"""
+
+import datetime
+import signal
+import threading
+import time
+import traceback
+
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Job, Book, OverviewSnapshot
+
+# Registered job handlers by kind, see @job
+HANDLERS = {}
+# Handlers that run periodically, by kind, with their interval
+PERIODIC = {}
+
+# Retry delays grow as RETRY_BASE * 2 ** (attempts - 1), up to RETRY_MAX
+RETRY_BASE = datetime.timedelta(seconds=30)
+RETRY_MAX = datetime.timedelta(hours=1)
+# A running job whose worker hasn't finished it by then is run again
+STALE_AFTER = datetime.timedelta(minutes=15)
+# How often the workers look for stale jobs and unqueued periodic ones
+UPKEEP_INTERVAL = datetime.timedelta(minutes=1)
+
+
+def job(kind, every=None):
+    """Register a function as the handler of the jobs of `kind`.
+
+    The handler gets the job's payload as keyword arguments. With `every`
+    (a timedelta) the job is scheduled again that long after each run.
+    """
+
+    def register(handler):
+        HANDLERS[kind] = handler
+        if every:
+            PERIODIC[kind] = every
+        return handler
+
+    return register
+
+
+def enqueue(kind, payload=None, dedupe_key=None, run_at=None):
+    """Queue a job. Does nothing if a job with the same `dedupe_key` is
+    already queued or running.
+
+    The job is added to the current transaction; it's up to the caller
+    to commit.
+    """
+
+    now = datetime.datetime.utcnow()
+    db.session.execute(
+        insert(Job.__table__)
+        .values(kind=kind, payload=payload or {}, dedupe_key=dedupe_key,
+                status="queued", attempts=0, max_attempts=5,
+                run_at=run_at or now, created_at=now)
+        .on_conflict_do_nothing())
+
+
+def dequeue():
+    """Claim the next due job, or return None if there is none.
+
+    SKIP LOCKED makes concurrent workers skip the rows another worker is
+    claiming instead of waiting for them.
+    """
+
+    now = datetime.datetime.utcnow()
+    claimed = (Job.query
+               .filter(Job.status == "queued", Job.run_at <= now)
+               .order_by(Job.run_at, Job.id)
+               .with_for_update(skip_locked=True)
+               .first())
+
+    if claimed:
+        claimed.status = "running"
+        claimed.attempts += 1
+        claimed.locked_at = now
+
+    db.session.commit()
+    return claimed
+
+
+def run_one():
+    """Claim and run one job. Returns False if there was nothing to do."""
+
+    claimed = dequeue()
+    if claimed is None:
+        return False
+
+    try:
+        HANDLERS[claimed.kind](**claimed.payload)
+
+    except Exception:
+        db.session.rollback()
+        retry_later(claimed, traceback.format_exc())
+
+    else:
+        claimed.status = "done"
+        claimed.last_error = None
+        schedule_next(claimed)
+
+    db.session.commit()
+    return True
+
+
+def schedule_next(finished):
+    """Queue the next run of a periodic job that is done or given up on."""
+
+    if finished.kind not in PERIODIC:
+        return
+
+    # Free the dedupe key before queuing the next run
+    db.session.flush()
+    enqueue(finished.kind, finished.payload, dedupe_key=finished.kind,
+            run_at=datetime.datetime.utcnow() + PERIODIC[finished.kind])
+
+
+def retry_later(failed, error):
+    """Queue a failed job again after a backoff, or give up on it."""
+
+    current_app.logger.error("Job %s failed:\n%s", failed, error)
+    failed.last_error = error
+
+    if failed.attempts >= failed.max_attempts:
+        failed.status = "failed"
+        # A periodic job still runs next time, e.g. after an API outage
+        schedule_next(failed)
+        return
+
+    delay = min(RETRY_BASE * 2 ** (failed.attempts - 1), RETRY_MAX)
+    failed.status = "queued"
+    failed.run_at = datetime.datetime.utcnow() + delay
+
+
+def requeue_stale():
+    """Queue again the jobs left running by a worker that died.
+
+    Each counts as a failed attempt, so a job that keeps crashing its
+    worker is given up on like any other.
+    """
+
+    stale = (Job.query
+             .filter(Job.status == "running",
+                     Job.locked_at < datetime.datetime.utcnow() - STALE_AFTER)
+             .with_for_update(skip_locked=True)
+             .all())
+
+    for crashed in stale:
+        retry_later(crashed, "The worker running the job died")
+    db.session.commit()
+
+
+def schedule_periodic():
+    """Make sure every periodic job is queued."""
+
+    for kind in PERIODIC:
+        enqueue(kind, dedupe_key=kind)
+    db.session.commit()
+
+
+def upkeep():
+    """Recover the jobs of dead workers and queue the missing periodic ones."""
+
+    requeue_stale()
+    schedule_periodic()
+
+
+def work(app, concurrency=1, poll_interval=1.0):
+    """Run `concurrency` worker threads until SIGINT/SIGTERM."""
+
+    stop = threading.Event()
+
+    def consume():
+        with app.app_context():
+            upkeep_at = time.monotonic() + UPKEEP_INTERVAL.total_seconds()
+            while not stop.is_set():
+                try:
+                    if time.monotonic() >= upkeep_at:
+                        upkeep()
+                        upkeep_at = (time.monotonic()
+                                     + UPKEEP_INTERVAL.total_seconds())
+                    busy = run_one()
+                except Exception:
+                    # e.g. the database went away, don't kill the thread
+                    app.logger.exception("Worker error")
+                    db.session.rollback()
+                    busy = False
+
+                if not busy:
+                    stop.wait(poll_interval)
+
+            db.session.remove()
+
+    with app.app_context():
+        upkeep()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *args: stop.set())
+
+    threads = [threading.Thread(target=consume, name=f"worker-{i}")
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    # Wait in short steps so the main thread keeps handling signals
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(0.5)
+
+
+#######################################################################################
+##################JOB HANDLERS ##########################################################
+#######################################################################################
+
+
+@job("record_snapshot")
+def record_snapshot_job(payload):
+    """Add a fetched overview (its cached payload) to the rank history."""
+
+    from history import record_snapshot
+    from overview import load_overview
+
+    overview = load_overview(payload)
+    if overview is not None:
+        record_snapshot(overview)
+
+
+def import_overview(date):
+    """Fetch the overview published on `date`, store it and add it to the
+    history."""
+
+    from functions import nyt_get
+    from history import record_snapshot
+    from overview import compact_overview, load_overview
+
+    data = nyt_get("full-overview.json", published_date=date)
+    payload = compact_overview(data["results"])
+
+    Book.add_listed_books(data["results"]["lists"])
+    OverviewSnapshot.store(payload)
+    # record_snapshot rolls back if another worker records the week first
+    db.session.commit()
+
+    record_snapshot(load_overview(payload))
+
+
+@job("refresh_overview", every=datetime.timedelta(hours=1))
+def refresh_overview_job():
+    """Fetch the current overview, so the homepage never waits for the API."""
+
+    import_overview(datetime.date.today().isoformat())
+
+
+@job("backfill_overview")
+def backfill_overview_job(date):
+    """Fetch the overview published on `date` and add it to the history."""
+
+    import_overview(date)
+
+
+@job("reconcile_counters", every=datetime.timedelta(hours=1))
+def reconcile_counters_job():
+    """Fix the books' trackers and readers counters if they drifted."""
+
+    Book.reconcile_counts()
@@ -1,10 +1,93 @@
 """SQLAlchemy models for NY Times Best Sellers Tracker."""
 
-from flask_bcrypt import Bcrypt
-from flask_sqlalchemy import SQLAlchemy
+import datetime
+import time
 
-bcrypt = Bcrypt()
-db = SQLAlchemy()
+from flask import g, has_request_context, session as flask_session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import event, func, orm, text
+from sqlalchemy.dialects.postgresql import insert
+
+from isbn import normalize_isbn
+from overview import book_isbns
+
+# Name of the SQLALCHEMY_BINDS entry used for the read replica
+REPLICA_BIND = "replica"
+# Flask session key holding the time of the user's last write
+LAST_WRITE_KEY = "last_write"
+# Most entries kept in each user's activity feed
+FEED_INBOX_LIMIT = 500
+
+
+def use_replica(app):
+    """Should reads in the current request go to the replica?
+
+    Only views marked as read only use the replica, and only if one is
+    configured. A user who wrote something in the last REPLICA_LAG_WINDOW
+    seconds keeps reading from the primary so they see their own changes.
+    """
+
+    if not has_request_context() or not g.get("use_replica"):
+        return False
+
+    if REPLICA_BIND not in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        return False
+
+    last_write = flask_session.get(LAST_WRITE_KEY)
+    if last_write and time.time() - last_write < app.config.get('REPLICA_LAG_WINDOW', 5):
+        return False
+
+    return True
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends the reads of read-only views to the replica."""
+
+    def get_bind(self, mapper=None, clause=None):
+        # Flushes are writes, so they always go to the primary
+        if not self._flushing and use_replica(self.app):
+            state = get_state(self.app)
+            return state.db.get_engine(self.app, bind=REPLICA_BIND)
+
+        return super().get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+@event.listens_for(RoutingSession, "after_commit")
+def remember_write(session, *args):
+    """After a write, stay on the primary for the rest of the request and
+    for the following REPLICA_LAG_WINDOW seconds (read-your-writes).
+
+    Commits count as writes too, as bulk and raw SQL statements don't flush.
+    """
+
+    if has_request_context():
+        g.use_replica = False
+        flask_session[LAST_WRITE_KEY] = time.time()
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy with replica routing and tuned Postgres engines."""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, info, options):
+        super().apply_driver_hacks(app, info, options)
+
+        # Pool size/overflow/timeout come from the SQLALCHEMY_POOL_* config
+        # keys; pre-ping and the statement timeout only make sense on Postgres
+        if info.drivername.startswith("postgres"):
+            options.setdefault(
+                "pool_pre_ping", app.config.get('SQLALCHEMY_POOL_PRE_PING', True))
+
+            timeout = app.config.get('DATABASE_STATEMENT_TIMEOUT')
+            if timeout:
+                connect_args = options.setdefault("connect_args", {})
+                connect_args["options"] = f"-c statement_timeout={int(timeout)}"
+
+
+db = RoutingSQLAlchemy()
 
 
 class User(db.Model):
@@ -57,6 +140,11 @@ class User(db.Model):
 
         return count
 
+    def is_following(self, other_user):
+        """Is this user following `other_user`?"""
+
+        return Follow.query.get((self.id, other_user.id)) is not None
+
     @classmethod
     def signup(cls, username, email, password, image_url):
         """Sign up user.
@@ -64,7 +152,10 @@ class User(db.Model):
         Hashes password and adds user to system.
         """
 
-        hashed_pwd = bcrypt.generate_password_hash(password).decode('UTF-8')
+        # bcrypt is only needed at signup/login, so don't import it at startup
+        from flask_bcrypt import generate_password_hash
+
+        hashed_pwd = generate_password_hash(password).decode('UTF-8')
 
         user = User(
             username=username,
@@ -86,10 +177,12 @@ class User(db.Model):
         If can't find matching user (or if password is wrong), returns False.
         """
 
+        from flask_bcrypt import check_password_hash
+
         user = cls.query.filter_by(username=username).first()
 
         if user:
-            is_auth = bcrypt.check_password_hash(user.password, password)
+            is_auth = check_password_hash(user.password, password)
             if is_auth:
                 return user
 
@@ -101,6 +194,12 @@ class Book(db.Model):
 
     __tablename__ = 'books'
 
+    __table_args__ = (
+        # The "Popular" page reads the top of these, newest first on ties
+        db.Index('ix_books_trackers_count', 'trackers_count', 'id'),
+        db.Index('ix_books_readers_count', 'readers_count', 'id'),
+    )
+
     id = db.Column(
         db.Integer,
         primary_key=True
@@ -123,34 +222,151 @@ class Book(db.Model):
         nullable=False
     )
 
-    # ISBN10 may contain the letter "X" at the end to represent a 10
+    # ISBN10 may contain the letter "X" at the end to represent a 10.
+    # Books whose ISBN13 starts with 979 have none
     isbn_10 = db.Column(
         db.String,
-        nullable=False,
         unique=True
     )
 
+    # Every ISBN10 has an ISBN13, so books are looked up by this one
+    isbn_13 = db.Column(
+        db.String,
+        unique=True,
+        index=True
+    )
+
+    # Popularity counters, kept up to date by the track/read views and
+    # corrected by reconcile_counts() if they ever drift
+    trackers_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default="0"
+    )
+
+    readers_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default="0"
+    )
+
     users_books = db.relationship("UserBook",
                                   cascade="all,delete",
                                   backref="Book")
 
+    @classmethod
+    def change_counts(cls, book_id, trackers=0, readers=0):
+        """Add `trackers` and `readers` (may be negative) to a book's counters.
+
+        The update is done in SQL so concurrent requests don't overwrite
+        each other's changes.
+        """
+
+        cls.query.filter_by(id=book_id).update(
+            {cls.trackers_count: cls.trackers_count + trackers,
+             cls.readers_count: cls.readers_count + readers},
+            synchronize_session=False)
+
+    @classmethod
+    def remove_user_counts(cls, user_id):
+        """Take a user's tracked and read books out of the counters
+        (call it before deleting the user)."""
+
+        db.session.execute(text("""
+            UPDATE books
+            SET trackers_count = trackers_count - 1,
+                readers_count = readers_count
+                    - CASE WHEN users_books.read_or_not THEN 1 ELSE 0 END
+            FROM users_books
+            WHERE users_books.book_id = books.id
+              AND users_books.user_id = :user_id
+        """), {"user_id": user_id})
+
+    @classmethod
+    def reconcile_counts(cls):
+        """Recount trackers and readers from users_books and fix the books
+        whose counters have drifted. Returns how many books were fixed."""
+
+        result = db.session.execute(text("""
+            UPDATE books
+            SET trackers_count = counts.trackers,
+                readers_count = counts.readers
+            FROM (
+                SELECT books.id,
+                       count(users_books.user_id) AS trackers,
+                       count(*) FILTER (WHERE users_books.read_or_not)
+                           AS readers
+                FROM books
+                LEFT JOIN users_books ON users_books.book_id = books.id
+                GROUP BY books.id
+            ) AS counts
+            WHERE counts.id = books.id
+              AND (books.trackers_count <> counts.trackers
+                   OR books.readers_count <> counts.readers)
+        """))
+
+        return result.rowcount
+
+    @property
+    def isbn(self):
+        """The ISBN used in the book's URLs"""
+
+        return self.isbn_10 or self.isbn_13
+
     @classmethod
     def add_book(cls, title, author, description, publisher,
-                 isbn_10):
-        """Add book into our databse
+                 isbn_10=None, isbn_13=None):
+        """Add book into our databse (with both ISBNs when we can compute
+        the missing one)
         """
 
+        isbns = normalize_isbn(isbn_13 or isbn_10)
+        if isbns:
+            isbn_10, isbn_13 = isbns
+
         book = Book(
             title=title,
             author=author,
             description=description,
             publisher=publisher,
-            isbn_10=isbn_10
+            isbn_10=isbn_10,
+            isbn_13=isbn_13
         )
 
         db.session.add(book)
         return book
 
+    @classmethod
+    def add_listed_books(cls, lists):
+        """Add the books of the overview's "lists" (from the API response)
+        that aren't in our DB yet, in one statement, so every listed book
+        can be shown without calling the API.
+        """
+
+        rows = {}
+        for lst in lists:
+            for book in lst["books"]:
+                isbn_10, isbn_13 = book_isbns(book)
+                if isbn_13 is None:
+                    continue
+
+                # A book is on several lists, keep one row per book
+                rows[isbn_13] = dict(
+                    title=book["title"],
+                    author=book["author"],
+                    description=book.get("description") or "",
+                    publisher=book.get("publisher") or "",
+                    isbn_10=isbn_10,
+                    isbn_13=isbn_13)
+
+        if rows:
+            # Skips the books we have, whichever ISBN they conflict on
+            db.session.execute(insert(cls.__table__)
+                               .values(list(rows.values()))
+                               .on_conflict_do_nothing())
+
 
 class UserBook(db.Model):
     """Connection of a user <-> book."""
@@ -163,10 +379,13 @@ class UserBook(db.Model):
         primary_key=True
     )
 
+    # Indexed on its own to find a book's trackers (the primary key only
+    # helps to find a user's books)
     book_id = db.Column(
         db.Integer,
         db.ForeignKey('books.id', ondelete="cascade"),
-        primary_key=True
+        primary_key=True,
+        index=True
     )
 
     read_or_not = db.Column(
@@ -175,6 +394,534 @@ class UserBook(db.Model):
     )
 
 
+class Follow(db.Model):
+    """Connection of a follower <-> followed user."""
+
+    __tablename__ = 'follows'
+
+    follower_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete="cascade"),
+        primary_key=True
+    )
+
+    # Indexed on its own for the fan-out, which looks up followers
+    followed_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete="cascade"),
+        primary_key=True,
+        index=True
+    )
+
+
+class FeedEntry(db.Model):
+    """Something a followed user did, copied into a follower's feed."""
+
+    __tablename__ = 'feed_entries'
+
+    # A feed page is a range scan on (owner_id, id)
+    __table_args__ = (
+        db.Index('ix_feed_entries_owner_id_id', 'owner_id', 'id'),
+    )
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+
+    # Whose feed the entry is in
+    owner_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete="cascade"),
+        nullable=False
+    )
+
+    actor_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete="cascade"),
+        nullable=False
+    )
+
+    book_id = db.Column(
+        db.Integer,
+        db.ForeignKey('books.id', ondelete="cascade"),
+        nullable=False
+    )
+
+    # "tracked" or "read"
+    verb = db.Column(
+        db.String(20),
+        nullable=False
+    )
+
+    created_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.datetime.utcnow
+    )
+
+    actor = db.relationship("User", foreign_keys=[actor_id])
+    book = db.relationship("Book")
+
+    @classmethod
+    def fan_out(cls, actor_id, book_id, verb):
+        """Write an entry into the feed of each of the actor's followers,
+        then trim those feeds to the newest FEED_INBOX_LIMIT entries."""
+
+        params = {"actor_id": actor_id, "book_id": book_id, "verb": verb,
+                  "created_at": datetime.datetime.utcnow(),
+                  "limit": FEED_INBOX_LIMIT}
+
+        result = db.session.execute(text("""
+            INSERT INTO feed_entries (owner_id, actor_id, book_id, verb,
+                                      created_at)
+            SELECT follower_id, :actor_id, :book_id, :verb, :created_at
+            FROM follows
+            WHERE followed_id = :actor_id
+        """), params)
+
+        # Nobody follows the actor, nothing to trim
+        if not result.rowcount:
+            return
+
+        # Each follower's (limit + 1)th newest entry is one probe of the
+        # (owner_id, id) index, only the inboxes that have one are trimmed
+        db.session.execute(text("""
+            DELETE FROM feed_entries
+            USING (
+                SELECT follows.follower_id AS owner_id, cutoff.id
+                FROM follows
+                CROSS JOIN LATERAL (
+                    SELECT id FROM feed_entries
+                    WHERE owner_id = follows.follower_id
+                    ORDER BY id DESC
+                    OFFSET :limit LIMIT 1
+                ) AS cutoff
+                WHERE follows.followed_id = :actor_id
+            ) AS over_limit
+            WHERE feed_entries.owner_id = over_limit.owner_id
+              AND feed_entries.id <= over_limit.id
+        """), params)
+
+    @classmethod
+    def page(cls, owner_id, before=None, per_page=20):
+        """Get a page of a user's feed, newest first, with the entries
+        older than the entry id `before`.
+
+        Returns the entries and the id to pass as `before` for the next
+        page (None on the last page).
+        """
+
+        query = (cls.query
+                 .options(db.joinedload(cls.actor), db.joinedload(cls.book))
+                 .filter(cls.owner_id == owner_id))
+
+        if before:
+            query = query.filter(cls.id < before)
+
+        # Get one more entry than needed to know if there is a next page
+        entries = query.order_by(cls.id.desc()).limit(per_page + 1).all()
+
+        if len(entries) > per_page:
+            return entries[:per_page], entries[per_page - 1].id
+
+        return entries, None
+
+
+class ListSnapshot(db.Model):
+    """A best sellers list as published on a given week."""
+
+    __tablename__ = 'list_snapshots'
+
+    __table_args__ = (
+        db.UniqueConstraint('list_name', 'published_date'),
+    )
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+
+    list_name = db.Column(
+        db.String,
+        nullable=False
+    )
+
+    published_date = db.Column(
+        db.Date,
+        nullable=False,
+        index=True
+    )
+
+    # ISBN-13s in rank order ("" for books without one)
+    isbns = db.Column(
+        db.ARRAY(db.String),
+        nullable=False
+    )
+
+    @classmethod
+    def previous_snapshots(cls, published_date):
+        """Get, for each list, its latest snapshot before `published_date`."""
+
+        return (cls.query
+                .filter(cls.published_date < published_date)
+                .distinct(cls.list_name)
+                .order_by(cls.list_name, cls.published_date.desc())
+                .all())
+
+    @classmethod
+    def latest_dates(cls, list_names):
+        """Get the date of the latest snapshot of each of `list_names`, by
+        list name."""
+
+        return dict(db.session.query(cls.list_name,
+                                     func.max(cls.published_date))
+                    .filter(cls.list_name.in_(list_names))
+                    .group_by(cls.list_name))
+
+
+class OverviewSnapshot(db.Model):
+    """The weekly overview as fetched by the refresh_overview job, in its
+    compact form (see overview.py), so the homepage doesn't call the API."""
+
+    __tablename__ = 'overview_snapshots'
+
+    published_date = db.Column(
+        db.Date,
+        primary_key=True
+    )
+
+    payload = db.Column(
+        db.JSON,
+        nullable=False
+    )
+
+    fetched_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.datetime.utcnow
+    )
+
+    @classmethod
+    def store(cls, payload):
+        """Store an overview's payload, replacing the one fetched before
+        for the same publication date."""
+
+        statement = insert(cls.__table__).values(
+            published_date=payload[1], payload=payload,
+            fetched_at=datetime.datetime.utcnow())
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[cls.published_date],
+            set_={"payload": statement.excluded.payload,
+                  "fetched_at": statement.excluded.fetched_at}))
+
+    @classmethod
+    def latest(cls):
+        """The overview with the latest publication date, or None."""
+
+        return cls.query.order_by(cls.published_date.desc()).first()
+
+
+class RankHistory(db.Model):
+    """Weekly ranks of a book on a list.
+
+    The ranks are packed one byte per week, starting at first_published,
+    with 0 for the weeks the book wasn't on the list.
+    """
+
+    __tablename__ = 'rank_history'
+
+    __table_args__ = (
+        db.UniqueConstraint('list_name', 'isbn_13'),
+    )
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+
+    list_name = db.Column(
+        db.String,
+        nullable=False
+    )
+
+    isbn_13 = db.Column(
+        db.String,
+        nullable=False,
+        index=True
+    )
+
+    first_published = db.Column(
+        db.Date,
+        nullable=False
+    )
+
+    last_published = db.Column(
+        db.Date,
+        nullable=False
+    )
+
+    ranks = db.Column(
+        db.LargeBinary,
+        nullable=False
+    )
+
+    @classmethod
+    def append(cls, list_name, published_date, ranks):
+        """Add a week's `ranks` ({isbn_13: rank}) of a list to the books'
+        histories. The week may be an old one (a backfill): it goes before
+        or in between the weeks already there."""
+
+        histories = {history.isbn_13: history for history in cls.query.filter(
+            cls.list_name == list_name, cls.isbn_13.in_(list(ranks)))}
+
+        for isbn_13, rank in ranks.items():
+            history = histories.get(isbn_13)
+            rank = bytes([min(rank, 255)])
+
+            if history is None:
+                db.session.add(cls(list_name=list_name,
+                                   isbn_13=isbn_13,
+                                   first_published=published_date,
+                                   last_published=published_date,
+                                   ranks=rank))
+
+            elif published_date > history.last_published:
+                missed = (published_date - history.last_published).days // 7 - 1
+                history.ranks = history.ranks + bytes(max(missed, 0)) + rank
+                history.last_published = published_date
+
+            elif published_date < history.first_published:
+                missed = (history.first_published - published_date).days // 7 - 1
+                history.ranks = rank + bytes(max(missed, 0)) + history.ranks
+                history.first_published = published_date
+
+            else:
+                week = (published_date - history.first_published).days // 7
+                history.ranks = (history.ranks[:week] + rank
+                                 + history.ranks[week + 1:])
+
+    @classmethod
+    def for_book(cls, book):
+        """Get the book's history on every list it has been on."""
+
+        return cls.query.filter_by(isbn_13=book.isbn_13).all()
+
+    def weeks_on_list(self):
+        """How many weeks was the book on the list?"""
+
+        return sum(1 for rank in self.ranks if rank)
+
+    def movement(self, latest_published):
+        """Places moved up on the list's latest week, published on
+        `latest_published` (negative if down), or None if the book wasn't on
+        the list that week or the week before."""
+
+        if self.last_published != latest_published:
+            return None
+        if len(self.ranks) < 2 or not self.ranks[-2]:
+            return None
+
+        return self.ranks[-2] - self.ranks[-1]
+
+    def sparkline(self, width=120, height=30):
+        """SVG polyline points of the ranks, best rank at the top.
+
+        Weeks off the list are drawn at the bottom, below the worst rank.
+        """
+
+        ranks = list(self.ranks)
+        worst = max(ranks) or 1
+        step = width / max(len(ranks) - 1, 1)
+
+        return " ".join(
+            f"{i * step:.1f},{(rank - 1 if rank else worst) / worst * height:.1f}"
+            for i, rank in enumerate(ranks))
+
+
+class BookChange(db.Model):
+    """A book that entered, left or moved on a list on a given week."""
+
+    __tablename__ = 'book_changes'
+
+    __table_args__ = (
+        db.UniqueConstraint('published_date', 'list_name', 'isbn_13'),
+    )
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+
+    published_date = db.Column(
+        db.Date,
+        nullable=False
+    )
+
+    list_name = db.Column(
+        db.String,
+        nullable=False
+    )
+
+    isbn_13 = db.Column(
+        db.String,
+        nullable=False
+    )
+
+    # "entered", "left" or "moved"
+    change = db.Column(
+        db.String(10),
+        nullable=False
+    )
+
+    # Rank this week (None if the book left the list)
+    rank = db.Column(
+        db.Integer
+    )
+
+    # Rank last week (None if the book entered the list)
+    previous_rank = db.Column(
+        db.Integer
+    )
+
+    @classmethod
+    def notify_trackers(cls, published_date):
+        """Copy the week's changes to every user tracking the changed books.
+
+        This is a single INSERT ... SELECT joining the change set with
+        users_books, however many users and books there are.
+        """
+
+        db.session.flush()
+        db.session.execute(text("""
+            INSERT INTO user_book_changes (user_id, change_id)
+            SELECT users_books.user_id, book_changes.id
+            FROM book_changes
+            JOIN books ON books.isbn_13 = book_changes.isbn_13
+            JOIN users_books ON users_books.book_id = books.id
+            WHERE book_changes.published_date = :published_date
+            ON CONFLICT DO NOTHING
+        """), {"published_date": published_date})
+
+    @classmethod
+    def latest_for_user(cls, user_id):
+        """Get the changes of the latest week to the user's tracked books,
+        as {isbn_13: [changes]}."""
+
+        latest = (db.session.query(db.func.max(cls.published_date))
+                  .join(UserBookChange)
+                  .filter(UserBookChange.user_id == user_id)
+                  .scalar())
+
+        changes = {}
+        if latest is None:
+            return changes
+
+        for change in (cls.query.join(UserBookChange)
+                       .filter(UserBookChange.user_id == user_id,
+                               cls.published_date == latest)
+                       .order_by(cls.list_name)):
+            changes.setdefault(change.isbn_13, []).append(change)
+
+        return changes
+
+
+class UserBookChange(db.Model):
+    """A change to one of the books a user tracks."""
+
+    __tablename__ = 'user_book_changes'
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete="cascade"),
+        primary_key=True
+    )
+
+    change_id = db.Column(
+        db.Integer,
+        db.ForeignKey('book_changes.id', ondelete="cascade"),
+        primary_key=True
+    )
+
+
+class Job(db.Model):
+    """A unit of background work, run by `flask worker` (see jobs.py)."""
+
+    __tablename__ = 'jobs'
+
+    __table_args__ = (
+        # Workers look for the next queued job that is due
+        db.Index('ix_jobs_queued_run_at', 'run_at',
+                 postgresql_where=text("status = 'queued'")),
+        # Only one pending job per dedupe key
+        db.Index('ix_jobs_dedupe_key', 'dedupe_key', unique=True,
+                 postgresql_where=text("status IN ('queued', 'running')")),
+    )
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+
+    # Name of the handler that runs the job
+    kind = db.Column(
+        db.String(50),
+        nullable=False
+    )
+
+    payload = db.Column(
+        db.JSON,
+        nullable=False,
+        default=dict
+    )
+
+    dedupe_key = db.Column(
+        db.String
+    )
+
+    # "queued", "running", "done" or "failed"
+    status = db.Column(
+        db.String(10),
+        nullable=False,
+        default="queued"
+    )
+
+    attempts = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0
+    )
+
+    max_attempts = db.Column(
+        db.Integer,
+        nullable=False,
+        default=5
+    )
+
+    run_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.datetime.utcnow
+    )
+
+    locked_at = db.Column(
+        db.DateTime
+    )
+
+    last_error = db.Column(
+        db.Text
+    )
+
+    created_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.datetime.utcnow
+    )
+
+    def __repr__(self):
+        return f"<Job #{self.id}: {self.kind} ({self.status})>"
+
+
 def connect_db(app):
     """Connect this database to provided Flask app.
 
@@ -183,3 +930,14 @@ def connect_db(app):
 
     db.app = app
     db.init_app(app)
+
+
+def dispose_engines(app):
+    """Drop the pooled connections of every engine of the app.
+
+    Call it in each forked worker so no worker reuses a connection opened
+    in the parent process.
+    """
+
+    for connector in get_state(app).connectors.values():
+        connector.get_engine().dispose()
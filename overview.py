@@ -0,0 +1,86 @@
+"""Compact representation of the NY Times best sellers overview.
+
+The raw overview JSON is large (buy links, review URLs, ISBN lists...)
+while the pages only use a handful of fields. We keep only those, in
+tuples, both in the cache and in memory.
+"""
+
+import sys
+from collections import namedtuple
+
+from isbn import normalize_isbn
+
+# Bump when the fields below change, so old cached payloads are refetched
+PAYLOAD_VERSION = 2
+
+
+# namedtuples have no per-instance __dict__, so they are as small as tuples
+class OverviewBook(namedtuple(
+        "OverviewBook",
+        ["title", "author", "rank", "book_image", "primary_isbn10",
+         "primary_isbn13"],
+        defaults=[None])):
+    """A book of the overview, with its ISBNs validated (None if the API
+    gave none or an invalid one)"""
+
+    __slots__ = ()
+
+    @property
+    def isbn(self):
+        """The ISBN used in the book's URLs"""
+
+        return self.primary_isbn10 or self.primary_isbn13
+
+
+OverviewList = namedtuple("OverviewList", ["list_name", "books"])
+
+Overview = namedtuple("Overview", ["published_date", "lists"])
+
+
+def compact_overview(results):
+    """Turn the "results" of the full-overview API response into the
+    payload we cache.
+
+    The payload is made of tuples, strings, ints and Nones only, so it
+    pickles small and fast. Strings repeated across lists (list names,
+    authors) are interned, so the pickle stores them once.
+    """
+
+    lists = tuple(
+        (sys.intern(lst["list_name"]),
+         tuple((book["title"],
+                sys.intern(book["author"]),
+                book["rank"],
+                book["book_image"])
+               + book_isbns(book)
+               for book in lst["books"]))
+        for lst in results["lists"])
+
+    return (PAYLOAD_VERSION, results["published_date"], lists)
+
+
+def book_isbns(book):
+    """The (isbn_10, isbn_13) of a book of the API response. Either is
+    None when the API gives neither a valid ISBN-10 nor ISBN-13 for it,
+    and isbn_10 for the ISBN-13s without one."""
+
+    return (normalize_isbn(book.get("primary_isbn13"))
+            or normalize_isbn(book.get("primary_isbn10"))
+            or (None, None))
+
+
+def load_overview(payload):
+    """Turn a cached payload back into an Overview for the templates.
+
+    Returns None if the payload was written with another PAYLOAD_VERSION.
+    """
+
+    version, published_date, lists = payload
+
+    if version != PAYLOAD_VERSION:
+        return None
+
+    return Overview(
+        published_date,
+        [OverviewList(list_name, [OverviewBook._make(book) for book in books])
+         for list_name, books in lists])
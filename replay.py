@@ -0,0 +1,110 @@
+"""Recorded NY Times API responses, for working and testing offline.
+
+With NYT_MODE=record every API response is saved in NYT_RECORDINGS; with
+NYT_MODE=replay the responses are served from there and the API is never
+called. Each recording is a JSON file holding the request (path and
+params, without the API key) and the response.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from urllib.parse import urlencode
+
+
+class MissingRecording(LookupError):
+    """There is no recorded response for a request."""
+
+
+def clean_params(params):
+    """The request's params as strings, without the API key."""
+
+    return {name: str(value) for name, value in params.items()
+            if name != "api-key"}
+
+
+def request_key(path, params):
+    """The request as a string, e.g. "history.json?isbn=..."."""
+
+    return f"{path}?{urlencode(sorted(params.items()))}"
+
+
+class ReplayStore:
+    """The recorded responses in `directory`."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _file(self, key):
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _load_index(self):
+        """Read the path and params of every recording (once)."""
+
+        with self._lock:
+            if self._index is None:
+                index = []
+                if os.path.isdir(self.directory):
+                    for name in sorted(os.listdir(self.directory)):
+                        if name.endswith(".json"):
+                            with open(os.path.join(self.directory, name)) as file:
+                                recording = json.load(file)
+                            index.append((recording["path"], recording["params"],
+                                          os.path.join(self.directory, name)))
+                self._index = index
+
+        return self._index
+
+    def get(self, path, params):
+        """The recorded response of a request.
+
+        A list asked for a date nobody recorded gets the latest recording
+        published on or before it, the way the API answers with the list
+        current on that date.
+        """
+
+        params = clean_params(params)
+        filename = self._file(request_key(path, params))
+
+        if not os.path.exists(filename):
+            filename = self._closest(path, params)
+
+        if filename is None:
+            raise MissingRecording(request_key(path, params))
+
+        with open(filename) as file:
+            return json.load(file)["response"]
+
+    def _closest(self, path, params):
+        date = params.get("published_date")
+        if date is None:
+            return None
+
+        others = {name: value for name, value in params.items()
+                  if name != "published_date"}
+        candidates = [
+            (recorded["published_date"], filename)
+            for recorded_path, recorded, filename in self._load_index()
+            if recorded_path == path
+            and recorded.get("published_date", "9999") <= date
+            and {name: value for name, value in recorded.items()
+                 if name != "published_date"} == others]
+
+        return max(candidates)[1] if candidates else None
+
+    def put(self, path, params, response):
+        """Record the response of a request."""
+
+        params = clean_params(params)
+        os.makedirs(self.directory, exist_ok=True)
+
+        with open(self._file(request_key(path, params)), "w") as file:
+            json.dump({"path": path, "params": params, "response": response},
+                      file, indent=2, sort_keys=True)
+
+        with self._lock:
+            self._index = None
@@ -1,8 +1,10 @@
 """Seed database with sample data from CSV Files."""
 
 
-from app import db
+from app import create_app
+from models import db
 
+app = create_app()
 
 db.drop_all()
 db.create_all()
@@ -0,0 +1,132 @@
+"""Static assets tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_assets.py
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from assets import (BUNDLES, FILES, DIST, MAX_AGE, build_assets, load_manifest,
+                    static_asset)
+from testing import create_test_app
+
+app = create_test_app()
+
+
+class AssetsTestCase(TestCase):
+    """Test building and serving the assets"""
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.manifest = load_manifest(app.static_folder)
+        self.css = "/assets/" + self.manifest["site.css"]["file"]
+
+    def dist_file(self, name):
+        with open(os.path.join(app.static_folder, DIST, name), "rb") as file:
+            return file.read()
+
+    def test_build_is_current(self):
+        """The committed build matches the sources (else run flask
+        build-assets)"""
+
+        with tempfile.TemporaryDirectory() as static:
+            for name in FILES + sum(BUNDLES.values(), ()):
+                os.makedirs(os.path.dirname(os.path.join(static, name)),
+                            exist_ok=True)
+                shutil.copy(os.path.join(app.static_folder, name),
+                            os.path.join(static, name))
+
+            self.assertEqual(build_assets(static), self.manifest)
+
+    def test_bundle(self):
+        """The bundle points to the built images"""
+
+        css = self.dist_file(self.manifest["site.css"]["file"]).decode()
+
+        self.assertIn("Bootstrap", css)
+        self.assertNotIn("/static/", css)
+        self.assertIn(self.manifest["images/nav-bg.png"]["file"], css)
+        self.assertNotIn("sourceMappingURL", css)
+
+    def test_brotli(self):
+        """Clients taking brotli get it, cached for good"""
+
+        resp = self.client.get(self.css, headers={"Accept-Encoding": "gzip, br"})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers["Content-Encoding"], "br")
+        self.assertEqual(resp.mimetype, "text/css")
+        self.assertEqual(resp.headers["Cache-Control"],
+                         f"public, max-age={MAX_AGE}, immutable")
+        self.assertIn("Accept-Encoding", resp.headers["Vary"])
+        self.assertEqual(
+            resp.get_data(),
+            self.dist_file(self.manifest["site.css"]["file"] + ".br"))
+
+    def test_gzip_and_identity(self):
+        """Others get gzip, or the file as it is"""
+
+        resp = self.client.get(self.css, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+
+        resp = self.client.get(self.css, headers={"Accept-Encoding": ""})
+        self.assertNotIn("Content-Encoding", resp.headers)
+        self.assertEqual(resp.get_data(),
+                         self.dist_file(self.manifest["site.css"]["file"]))
+
+    def test_image(self):
+        """Images aren't compressed again"""
+
+        resp = self.client.get(
+            "/assets/" + self.manifest["images/nytime-logo.png"]["file"],
+            headers={"Accept-Encoding": "gzip, br"})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, "image/png")
+        self.assertNotIn("Content-Encoding", resp.headers)
+        self.assertIn("immutable", resp.headers["Cache-Control"])
+
+    def test_unknown(self):
+        """Only the built assets are served"""
+
+        resp = self.client.get("/assets/site.0000000000.css")
+        self.assertEqual(resp.status_code, 404)
+
+    def test_pages(self):
+        """Pages link to the built assets, and load no scripts"""
+
+        resp = self.client.get("/login")
+        html = resp.get_data(as_text=True)
+
+        self.assertIn(f'href="{self.css}"', html)
+        self.assertIn(self.manifest["favicon.ico"]["file"], html)
+        self.assertNotIn("unpkg.com", html)
+        self.assertNotIn("<script", html)
+
+    def test_static_url(self):
+        """Stored /static/ URLs, like the default picture, get the built
+        asset"""
+
+        with app.test_request_context():
+            self.assertEqual(
+                static_asset("/static/images/default-pic.png"),
+                "/assets/" + self.manifest["images/default-pic.png"]["file"])
+            self.assertEqual(static_asset("https://example.com/me.png"),
+                             "https://example.com/me.png")
+
+    def test_unbuilt(self):
+        """Without a build the sources are used"""
+
+        unbuilt = create_test_app()
+        unbuilt.extensions['assets'] = {"urls": {}, "encodings": {}}
+
+        resp = unbuilt.test_client().get("/login")
+        self.assertIn('href="/assets/site.css"', resp.get_data(as_text=True))
+
+        resp = unbuilt.test_client().get("/assets/site.css")
+        self.assertEqual(resp.headers["Cache-Control"], "no-cache")
+        self.assertIn(b"Bootstrap", resp.get_data())
+        self.assertIn(b"/static/images/nav-bg.png", resp.get_data())
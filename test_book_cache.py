@@ -0,0 +1,123 @@
+"""Book metadata cache tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_book_cache.py
+
+from unittest import TestCase
+
+from sqlalchemy import event
+
+from book_cache import LRUCache, get_book, _books
+from models import db, Book
+from testing import create_test_app, DBTestCase
+
+app = create_test_app()
+
+
+class LRUCacheTestCase(TestCase):
+    """Test the bounded LRU"""
+
+    def test_evicts_least_recently_used(self):
+        """The entry used the longest time ago goes first"""
+
+        lru = LRUCache(maxsize=2, ttl=60)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        # "a" is now more recent than "b"
+        lru.get("a")
+        lru.set("c", 3)
+
+        self.assertEqual(lru.get("a"), 1)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("c"), 3)
+        self.assertEqual(len(lru), 2)
+
+    def test_expires(self):
+        """Entries older than the TTL are gone"""
+
+        lru = LRUCache(maxsize=2, ttl=-1)
+        lru.set("a", 1)
+
+        self.assertIsNone(lru.get("a"))
+
+
+class GetBookTestCase(DBTestCase):
+    """Test looking up books through the cache"""
+
+    app = app
+
+    def setUp(self):
+        """Add a book and count the queries"""
+
+        super().setUp()
+        self.context = app.app_context()
+        self.context.push()
+
+        Book.add_book("test_title", "test_author", "test_description",
+                      "test_publisher", "1668002175")
+        db.session.commit()
+
+        self.queries = []
+        event.listen(db.engine, "before_cursor_execute", self.count)
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+
+        event.remove(db.engine, "before_cursor_execute", self.count)
+        self.context.pop()
+        super().tearDown()
+
+    def count(self, conn, cursor, statement, *args):
+        # Leave out the tests' SAVEPOINTs
+        if statement.startswith("SELECT"):
+            self.queries.append(statement)
+
+    def test_cached(self):
+        """The second lookup shouldn't touch the DB"""
+
+        book = get_book("1668002175")
+        self.assertEqual(book.title, "test_title")
+        self.assertEqual(len(self.queries), 1)
+
+        self.assertEqual(get_book("1668002175"), book)
+        self.assertEqual(len(self.queries), 1)
+
+    def test_isbn_13(self):
+        """Both ISBNs of a book share its cache entry"""
+
+        book = get_book("1668002175")
+
+        self.assertEqual(get_book("978-1668002179"), book)
+        self.assertEqual(book.isbn_13, "9781668002179")
+        self.assertEqual(len(self.queries), 1)
+
+    def test_invalid(self):
+        """Invalid ISBNs don't reach the DB"""
+
+        self.assertIsNone(get_book("1668002176"))
+        self.assertEqual(self.queries, [])
+
+    def test_missing(self):
+        """Unknown ISBNs aren't cached"""
+
+        self.assertIsNone(get_book("0000000000"))
+        self.assertNotIn("9780000000002", _books._entries)
+
+    def test_invalidated_on_update(self):
+        """Changing a book drops it from the cache"""
+
+        get_book("1668002175")
+        Book.query.filter_by(isbn_10="1668002175").one().title = "new_title"
+        db.session.commit()
+
+        self.assertEqual(get_book("1668002175").title, "new_title")
+
+    def test_counters_dont_invalidate(self):
+        """Counter updates leave the metadata cached"""
+
+        book = get_book("1668002175")
+        Book.change_counts(book.id, trackers=1)
+        db.session.commit()
+
+        self.assertIn("9781668002179", _books._entries)
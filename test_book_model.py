@@ -5,38 +5,25 @@
 #    python -m unittest test_book_model.py
 
 
-from app import app
-import os
-from unittest import TestCase
 from sqlalchemy import exc
 
 from models import db, User, Book, UserBook
+from testing import create_test_app, DBTestCase
 
-# BEFORE we import our app, let's set an environmental variable
-# to use a different database for tests (we need to do this
-# before we import our app, since that will have already
-# connected to the database
+# The app works on the test database, and each test's changes are rolled
+# back (see testing.py), so there is no data to delete between tests
+app = create_test_app()
 
-os.environ['DATABASE_URL'] = "postgresql:/// nyt_best_sellers_test"
 
-
-# Now we can import app
-
-
-# Create our tables (we do this here, so we only create the tables
-# once for all tests --- in each test, we'll delete the data
-# and create fresh new clean test data
-
-db.create_all()
-
-
-class BookModelTestCase(TestCase):
+class BookModelTestCase(DBTestCase):
     """Test views for messages."""
 
+    app = app
+
     def setUp(self):
         """Create test client, add sample data."""
-        db.drop_all()
-        db.create_all()
+
+        super().setUp()
 
         user = User.signup(
             "test_user", "test_email@email.com", "test_password", None)
@@ -52,11 +39,6 @@ class BookModelTestCase(TestCase):
 
         self.client = app.test_client()
 
-    def tearDown(self):
-        """Clean up any fouled transaction."""
-
-        db.session.rollback()
-
     def test_userbook_model(self):
         """Does basic model work?"""
 
@@ -78,3 +60,46 @@ class BookModelTestCase(TestCase):
         self.assertEqual(relation.user_id, self.user.id)
         # The book shoul'd not be read as default
         self.assertEqual(relation.read_or_not, False)
+
+    def test_reconcile_counts(self):
+        """Do the counters get fixed when they drift?"""
+
+        relation = UserBook(
+            user_id=self.user.id,
+            book_id=self.book.id,
+            read_or_not=True
+        )
+
+        db.session.add(relation)
+        # The counters weren't updated, as if an update got lost
+        db.session.commit()
+        self.assertEqual(self.book.trackers_count, 0)
+
+        fixed = Book.reconcile_counts()
+        db.session.commit()
+
+        # Only our book needed fixing
+        self.assertEqual(fixed, 1)
+        self.assertEqual(self.book.trackers_count, 1)
+        self.assertEqual(self.book.readers_count, 1)
+
+    def test_add_listed_books(self):
+        """Are the overview's books added once, with both ISBNs?"""
+
+        book = {"title": "FAIRY TALE", "author": "Stephen King",
+                "description": "", "publisher": "Scribner",
+                "primary_isbn10": "1668002175",
+                "primary_isbn13": "9781668002179"}
+        lists = [{"books": [book]}, {"books": [book]},
+                 {"books": [dict(book, primary_isbn10="None",
+                                 primary_isbn13="nope")]}]
+
+        Book.add_listed_books(lists)
+        # Adding them again does nothing
+        Book.add_listed_books(lists)
+        db.session.commit()
+
+        added = Book.query.filter_by(isbn_13="9781668002179").one()
+        self.assertEqual(added.isbn_10, "1668002175")
+        # The book without a valid ISBN was left out
+        self.assertEqual(Book.query.count(), 2)
@@ -0,0 +1,117 @@
+"""Read replica routing tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_db_routing.py
+#
+# They need a second database to play the replica:
+#
+#    createdb nyt_best_sellers_test_replica
+#
+# The routing needs real commits that both databases see, so unlike the
+# other tests these don't run in a rolled back transaction.
+
+
+from unittest import TestCase
+
+from functions import CURR_USER_KEY
+from models import db, User, REPLICA_BIND, LAST_WRITE_KEY
+from testing import (create_test_app, create_tables, database_url,
+                     TEST_REPLICA_URL)
+
+app = create_test_app()
+
+REPLICA_URL = database_url(TEST_REPLICA_URL)
+
+app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: REPLICA_URL}
+replica = db.get_engine(app, bind=REPLICA_BIND)
+# Only these tests route to the replica, see setUp/tearDown
+app.config['SQLALCHEMY_BINDS'] = None
+
+create_tables(replica)
+
+
+class DBRoutingTestCase(TestCase):
+    """Test which database each kind of view reads from"""
+
+    def setUp(self):
+        """Create the same user in both databases, with a stale email in the
+        replica so we can tell which one answered."""
+
+        for table in reversed(db.Model.metadata.sorted_tables):
+            replica.execute(table.delete())
+        User.query.delete()
+
+        user = User.signup(username="testuser",
+                           email="primary@test.com",
+                           password="testuser",
+                           image_url=None)
+        db.session.commit()
+
+        replica.execute(User.__table__.insert().values(
+            id=user.id, username=user.username, email="replica@test.com",
+            password=user.password, image_url=user.image_url))
+
+        # Engines are created lazily and cached, so adding the bind back is
+        # enough for the session to start routing read-only views to it
+        app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: REPLICA_URL}
+
+        self.user_id = user.id
+        self.client = app.test_client()
+
+    def tearDown(self):
+        """Clean up any fouled transaction, and the committed rows the other
+        tests must not see."""
+
+        db.session.rollback()
+        app.config['SQLALCHEMY_BINDS'] = None
+        User.query.delete()
+        db.session.commit()
+
+    def test_read_only_view_uses_replica(self):
+        """A read-only view should read from the replica"""
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user_id
+
+            resp = c.get(f"/users/{self.user_id}")
+            html = resp.get_data(as_text=True)
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("replica@test.com", html)
+
+    def test_write_view_uses_primary(self):
+        """Views that aren't marked read only should read from the primary"""
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user_id
+
+            resp = c.get("/users/edit")
+            html = resp.get_data(as_text=True)
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("primary@test.com", html)
+
+    def test_read_your_writes(self):
+        """After a write the user should keep reading from the primary"""
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user_id
+
+            resp = c.post("/users/edit",
+                          data={"username": "testuser",
+                                "email": "changed@test.com",
+                                "image_url": "",
+                                "password": "testuser"},
+                          follow_redirects=True)
+            html = resp.get_data(as_text=True)
+
+            # The redirect lands on a read-only view, but we just wrote
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("changed@test.com", html)
+
+            with c.session_transaction() as sess:
+                self.assertIn(LAST_WRITE_KEY, sess)
@@ -0,0 +1,90 @@
+"""Rank history tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_history.py
+
+import datetime
+from unittest import TestCase
+
+from history import rank_movements, diff_lists
+from models import RankHistory
+
+
+class RankMovementsTestCase(TestCase):
+    """Test the week-over-week movement of a list"""
+
+    def test_movements(self):
+        """Do we get how many places each book moved?"""
+
+        movements, new = rank_movements(["a", "b", "c", "d"],
+                                        ["c", "a", "e", "b"])
+
+        # c went up 2, a down 1, e is new and b down 2
+        self.assertEqual(movements.tolist(), [2, -1, 0, -2])
+        self.assertEqual(new.tolist(), [False, False, True, False])
+
+    def test_first_week(self):
+        """Every book is new on the first snapshot of a list"""
+
+        movements, new = rank_movements([], ["a", "b"])
+
+        self.assertEqual(movements.tolist(), [0, 0])
+        self.assertEqual(new.tolist(), [True, True])
+
+    def test_missing_isbn(self):
+        """Books without an ISBN are never matched"""
+
+        movements, new = rank_movements(["", "a"], ["a", ""])
+
+        self.assertEqual(movements.tolist(), [1, 0])
+        self.assertEqual(new.tolist(), [False, True])
+
+
+class DiffListsTestCase(TestCase):
+    """Test the weekly change set of a list"""
+
+    def test_diff(self):
+        """Do we find the books that entered, left and moved?"""
+
+        changes = diff_lists(["a", "b", "c"], ["b", "a", "d"])
+
+        self.assertCountEqual(changes, [
+            ("d", "entered", 3, None),
+            ("b", "moved", 1, 2),
+            ("a", "moved", 2, 1),
+            ("c", "left", None, 3),
+        ])
+
+    def test_no_changes(self):
+        """Nothing changes if the list stays the same"""
+
+        self.assertEqual(diff_lists(["a", "b"], ["a", "b"]), [])
+
+
+class RankHistoryTestCase(TestCase):
+    """Test the packed weekly ranks"""
+
+    def test_history(self):
+        """Do we read movement and weeks on list from the packed ranks?"""
+
+        history = RankHistory(list_name="Hardcover Fiction",
+                              isbn_13="9781668002179",
+                              first_published=datetime.date(2022, 10, 2),
+                              last_published=datetime.date(2022, 10, 30),
+                              ranks=bytes([3, 0, 5, 4, 1]))
+
+        self.assertEqual(history.weeks_on_list(), 4)
+        self.assertEqual(history.movement(datetime.date(2022, 10, 30)), 3)
+        # Not on the list's latest week
+        self.assertIsNone(history.movement(datetime.date(2022, 11, 6)))
+        # One point per week
+        self.assertEqual(len(history.sparkline().split()), 5)
+
+    def test_sparkline(self):
+        """Weeks off the list are drawn at the bottom, inside the box"""
+
+        history = RankHistory(ranks=bytes([3, 0, 1]))
+
+        self.assertEqual(history.sparkline(width=120, height=30),
+                         "0.0,20.0 60.0,30.0 120.0,0.0")
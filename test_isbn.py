@@ -0,0 +1,57 @@
+"""ISBN validation tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_isbn.py
+
+from unittest import TestCase
+
+from isbn import is_isbn10, is_isbn13, isbn10_to_13, isbn13_to_10, normalize_isbn
+
+
+class ISBNTestCase(TestCase):
+    """Test ISBN check digits and conversions"""
+
+    def test_check_digits(self):
+        """Are valid ISBNs accepted and typos refused?"""
+
+        self.assertTrue(is_isbn10("1668002175"))
+        self.assertTrue(is_isbn10("080442957X"))
+        self.assertTrue(is_isbn13("9781668002179"))
+
+        self.assertFalse(is_isbn10("1668002176"))
+        self.assertFalse(is_isbn10("X668002175"))
+        self.assertFalse(is_isbn13("9781668002178"))
+        self.assertFalse(is_isbn13("1234567890128"))
+
+    def test_conversions(self):
+        """Do ISBN-10s and ISBN-13s convert both ways?"""
+
+        self.assertEqual(isbn10_to_13("1668002175"), "9781668002179")
+        self.assertEqual(isbn13_to_10("9781668002179"), "1668002175")
+        self.assertEqual(isbn13_to_10("9780804429573"), "080442957X")
+        # 979 ISBN-13s have no ISBN-10
+        self.assertIsNone(isbn13_to_10("9791032305690"))
+
+    def test_normalize(self):
+        """Any form of an ISBN gives the same pair"""
+
+        pair = ("1668002175", "9781668002179")
+
+        self.assertEqual(normalize_isbn("1668002175"), pair)
+        self.assertEqual(normalize_isbn("978-1-668-00217-9"), pair)
+        self.assertEqual(normalize_isbn(" 1 668 00217 5"), pair)
+        self.assertEqual(normalize_isbn("080442957x"),
+                         ("080442957X", "9780804429573"))
+
+        self.assertIsNone(normalize_isbn("None"))
+        self.assertIsNone(normalize_isbn(""))
+        self.assertIsNone(normalize_isbn("1668002175'; --"))
+
+    def test_non_ascii_digits(self):
+        """Only ASCII digits make an ISBN"""
+
+        # Superscript twos and Arabic-Indic digits are str.isdigit() too
+        self.assertIsNone(normalize_isbn("²²²²²²²²²0"))
+        self.assertIsNone(normalize_isbn("١٦٦٨٠٠٢١٧٥"))
+        self.assertFalse(is_isbn13("978١٦٦٨٠٠٢١٧9"))
@@ -0,0 +1,198 @@
+"""Background jobs tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_jobs.py
+
+import datetime
+
+from functions import stored_overview
+from jobs import (job, enqueue, run_one, requeue_stale, HANDLERS, PERIODIC,
+                  STALE_AFTER)
+from models import db, Job, ListSnapshot, RankHistory
+from testing import create_test_app, DBTestCase
+
+app = create_test_app()
+
+CALLS = []
+
+
+@job("test_job")
+def sample_job(fail=False):
+    CALLS.append(fail)
+    if fail:
+        raise ValueError("Job failed")
+
+
+class JobsTestCase(DBTestCase):
+    """Test queuing and running jobs"""
+
+    app = app
+
+    def setUp(self):
+        """Start from an empty queue"""
+
+        super().setUp()
+        # Jobs run in the worker's app context
+        self.context = app.app_context()
+        self.context.push()
+
+        CALLS.clear()
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+
+        self.context.pop()
+        super().tearDown()
+
+    def test_run_job(self):
+        """Is a queued job run once and marked as done?"""
+
+        enqueue("test_job")
+        db.session.commit()
+
+        self.assertTrue(run_one())
+        # Nothing else to run
+        self.assertFalse(run_one())
+
+        self.assertEqual(CALLS, [False])
+        self.assertEqual(Job.query.one().status, "done")
+
+    def test_dedupe(self):
+        """Only one pending job per dedupe key"""
+
+        enqueue("test_job", dedupe_key="same")
+        enqueue("test_job", dedupe_key="same")
+        db.session.commit()
+
+        self.assertEqual(Job.query.count(), 1)
+
+        # Once done, the key can be used again
+        run_one()
+        enqueue("test_job", dedupe_key="same")
+        db.session.commit()
+
+        self.assertEqual(Job.query.count(), 2)
+
+    def test_retry(self):
+        """A failed job is queued again later, then given up on"""
+
+        enqueue("test_job", {"fail": True})
+        db.session.commit()
+
+        run_one()
+        failed = Job.query.one()
+
+        self.assertEqual(failed.status, "queued")
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn("Job failed", failed.last_error)
+        self.assertGreater(failed.run_at, datetime.datetime.utcnow())
+        # Not due yet
+        self.assertFalse(run_one())
+
+        failed.run_at = datetime.datetime.utcnow()
+        failed.attempts = failed.max_attempts - 1
+        db.session.commit()
+
+        run_one()
+        self.assertEqual(Job.query.one().status, "failed")
+
+    def test_periodic(self):
+        """A periodic job is queued again after it runs"""
+
+        PERIODIC["test_job"] = datetime.timedelta(hours=1)
+        try:
+            enqueue("test_job", dedupe_key="test_job")
+            db.session.commit()
+            run_one()
+        finally:
+            del PERIODIC["test_job"]
+
+        next_run = Job.query.filter_by(status="queued").one()
+        self.assertGreater(next_run.run_at, datetime.datetime.utcnow())
+
+    def test_periodic_failed(self):
+        """A periodic job given up on is still queued for its next run"""
+
+        PERIODIC["test_job"] = datetime.timedelta(hours=1)
+        try:
+            enqueue("test_job", {"fail": True}, dedupe_key="test_job")
+            last_try = Job.query.one()
+            last_try.attempts = last_try.max_attempts - 1
+            db.session.commit()
+            run_one()
+        finally:
+            del PERIODIC["test_job"]
+
+        self.assertEqual(Job.query.filter_by(status="failed").count(), 1)
+        next_run = Job.query.filter_by(status="queued").one()
+        self.assertEqual(next_run.attempts, 0)
+        self.assertGreater(next_run.run_at - datetime.datetime.utcnow(),
+                           datetime.timedelta(minutes=59))
+
+    def test_stale(self):
+        """A job left running by a dead worker is run again, as a new
+        attempt, until it's given up on"""
+
+        PERIODIC["test_job"] = datetime.timedelta(hours=1)
+        try:
+            enqueue("test_job", dedupe_key="test_job")
+            crashed = Job.query.one()
+            crashed.status = "running"
+            crashed.attempts = 1
+            crashed.locked_at = datetime.datetime.utcnow() - STALE_AFTER * 2
+            db.session.commit()
+
+            requeue_stale()
+            self.assertEqual(crashed.status, "queued")
+            self.assertIn("died", crashed.last_error)
+
+            crashed.status = "running"
+            crashed.attempts = crashed.max_attempts
+            db.session.commit()
+
+            requeue_stale()
+        finally:
+            del PERIODIC["test_job"]
+
+        self.assertEqual(crashed.status, "failed")
+        # The periodic job isn't stuck behind it
+        self.assertEqual(Job.query.filter_by(status="queued").count(), 1)
+
+    def test_handlers(self):
+        """The app's jobs are registered"""
+
+        for kind in ("record_snapshot", "backfill_overview", "refresh_overview",
+                     "reconcile_counters"):
+            self.assertIn(kind, HANDLERS)
+
+    def test_refresh_overview(self):
+        """The refreshed overview is stored for the homepage and recorded"""
+
+        HANDLERS["refresh_overview"]()
+
+        # The recorded overview is the latest one before today
+        version, published_date, lists = stored_overview()
+        self.assertEqual(published_date, "2022-10-30")
+        self.assertEqual(
+            ListSnapshot.query.filter_by(
+                published_date=datetime.date(2022, 10, 30)).count(),
+            len(lists))
+
+    def test_backfill_history(self):
+        """Backfilled weeks go before or in between the recorded ones"""
+
+        def week(day, rank):
+            RankHistory.append("Hardcover Fiction", datetime.date(2022, 10, day),
+                               {"9781668002179": rank})
+
+        week(23, 3)
+        week(30, 1)
+        week(9, 7)
+        week(16, 5)
+        db.session.commit()
+
+        history = RankHistory.query.one()
+        self.assertEqual(history.first_published, datetime.date(2022, 10, 9))
+        self.assertEqual(history.last_published, datetime.date(2022, 10, 30))
+        self.assertEqual(list(history.ranks), [7, 5, 3, 1])
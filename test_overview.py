@@ -0,0 +1,83 @@
+"""Overview payload tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_overview.py
+
+import pickle
+from unittest import TestCase
+
+from overview import compact_overview, load_overview, PAYLOAD_VERSION
+
+RESULTS = {
+    "published_date": "2022-10-30",
+    "lists": [{
+        "list_name": "Combined Print and E-Book Fiction",
+        "books": [{
+            "title": "FAIRY TALE",
+            "author": "Stephen King",
+            "rank": 1,
+            "book_image": "https://example.com/fairy-tale.jpg",
+            "primary_isbn10": "1668002175",
+            "primary_isbn13": "9781668002179",
+            "publisher": "Scribner",
+            "buy_links": [{"name": "Amazon", "url": "https://example.com"}],
+        }],
+    }],
+}
+
+
+class OverviewTestCase(TestCase):
+    """Test the compact overview representation"""
+
+    def test_round_trip(self):
+        """Does the payload survive the cache and keep what home.html uses?"""
+
+        payload = pickle.loads(pickle.dumps(compact_overview(RESULTS)))
+        overview = load_overview(payload)
+
+        self.assertEqual(overview.published_date, "2022-10-30")
+        self.assertEqual(overview.lists[0].list_name,
+                         "Combined Print and E-Book Fiction")
+
+        book = overview.lists[0].books[0]
+        self.assertEqual(book.title, "FAIRY TALE")
+        self.assertEqual(book.author, "Stephen King")
+        self.assertEqual(book.rank, 1)
+        self.assertEqual(book.primary_isbn10, "1668002175")
+        self.assertEqual(book.primary_isbn13, "9781668002179")
+        # Fields the pages don't use are dropped
+        self.assertFalse(hasattr(book, "buy_links"))
+
+    def test_payload_is_plain_data(self):
+        """The cached form should only hold tuples, strings and ints"""
+
+        def check(value):
+            if isinstance(value, tuple):
+                self.assertIs(type(value), tuple)
+                for item in value:
+                    check(item)
+            elif value is not None:
+                self.assertIsInstance(value, (str, int))
+
+        check(compact_overview(RESULTS))
+
+    def test_isbns(self):
+        """Invalid ISBNs are dropped and 979 ISBN-13s are kept"""
+
+        book = dict(RESULTS["lists"][0]["books"][0],
+                    primary_isbn10="None", primary_isbn13="9791032305690")
+        results = dict(RESULTS, lists=[dict(RESULTS["lists"][0], books=[book])])
+
+        book = load_overview(compact_overview(results)).lists[0].books[0]
+
+        self.assertIsNone(book.primary_isbn10)
+        self.assertEqual(book.isbn, "9791032305690")
+
+    def test_old_payload(self):
+        """Payloads from another version should be refused"""
+
+        version, published_date, lists = compact_overview(RESULTS)
+
+        self.assertIsNone(
+            load_overview((PAYLOAD_VERSION + 1, published_date, lists)))
@@ -0,0 +1,72 @@
+"""Recorded NY Times API responses tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_replay.py
+
+import os
+import tempfile
+from unittest import TestCase
+
+from replay import ReplayStore, MissingRecording
+
+
+class ReplayStoreTestCase(TestCase):
+    """Test recording and replaying responses"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ReplayStore(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_exact(self):
+        """A recorded request gets its response back"""
+
+        self.store.put("history.json", {"isbn": "9781668002179"}, {"n": 1})
+
+        self.assertEqual(
+            self.store.get("history.json", {"isbn": "9781668002179"}), {"n": 1})
+
+    def test_api_key(self):
+        """The API key is neither saved nor part of the request"""
+
+        self.store.put("history.json", {"isbn": "1", "api-key": "secret"},
+                       {"n": 1})
+
+        [name] = os.listdir(self.directory.name)
+        with open(os.path.join(self.directory.name, name)) as file:
+            self.assertNotIn("secret", file.read())
+
+        self.assertEqual(
+            self.store.get("history.json", {"isbn": "1", "api-key": "other"}),
+            {"n": 1})
+
+    def test_closest_date(self):
+        """A date nobody recorded gets the list published before it"""
+
+        for date in ("2022-10-16", "2022-10-30"):
+            self.store.put("full-overview.json", {"published_date": date},
+                           {"date": date})
+
+        self.assertEqual(
+            self.store.get("full-overview.json",
+                           {"published_date": "2022-11-02"}),
+            {"date": "2022-10-30"})
+        self.assertEqual(
+            self.store.get("full-overview.json",
+                           {"published_date": "2022-10-20"}),
+            {"date": "2022-10-16"})
+
+    def test_missing(self):
+        """Unrecorded requests fail instead of calling the API"""
+
+        self.store.put("full-overview.json",
+                       {"published_date": "2022-10-30"}, {})
+
+        with self.assertRaises(MissingRecording):
+            self.store.get("full-overview.json",
+                           {"published_date": "2022-10-01"})
+        with self.assertRaises(MissingRecording):
+            self.store.get("history.json", {"isbn": "9781668002179"})
@@ -0,0 +1,46 @@
+"""Startup tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_startup.py
+
+import subprocess
+import sys
+from unittest import TestCase
+
+# Modules that are slow to import and only needed by some requests
+LAZY_MODULES = ("requests", "bcrypt", "flask_bcrypt", "numpy", "brotli")
+
+
+def modules_after(code):
+    """Names of the modules loaded after running `code` in a fresh interpreter."""
+
+    out = subprocess.run(
+        [sys.executable, "-c",
+         f"import sys\n{code}\nprint('\\n'.join(sys.modules))"],
+        check=True, capture_output=True, text=True)
+
+    return set(out.stdout.split())
+
+
+class StartupTestCase(TestCase):
+    """Test that building the app doesn't pull in request-only modules"""
+
+    def test_import_app(self):
+        """Importing the app module shouldn't import the blueprints or
+        the lazy modules"""
+
+        modules = modules_after("import app")
+
+        self.assertNotIn("books", modules)
+        for name in LAZY_MODULES:
+            self.assertNotIn(name, modules)
+
+    def test_create_app(self):
+        """Creating the app shouldn't import the lazy modules"""
+
+        modules = modules_after("import app\napp.create_app()")
+
+        self.assertIn("books", modules)
+        for name in LAZY_MODULES:
+            self.assertNotIn(name, modules)
@@ -0,0 +1,101 @@
+"""Request tracing tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_tracing.py
+
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from functions import CURR_USER_KEY
+from testing import create_test_app
+from tracing import JSONLinesExporter
+
+
+class ListExporter:
+    """Keeps the exported traces"""
+
+    def __init__(self):
+        self.traces = []
+
+    def export(self, trace):
+        self.traces.append(trace)
+
+
+exporter = ListExporter()
+
+app = create_test_app(TRACING=True, TRACE_EXPORTER=exporter,
+                      TRACE_SAMPLE_RATE=1.0)
+
+
+class TracingTestCase(TestCase):
+    """Test the traces of requests"""
+
+    def setUp(self):
+        exporter.traces.clear()
+        app.config.update(TRACE_SAMPLE_RATE=1.0, TRACE_SLOW_MS=1000)
+        self.client = app.test_client()
+
+    def test_spans(self):
+        """A request is traced with its view, SQL and template spans"""
+
+        with self.client.session_transaction() as sess:
+            # No such user, add_user_to_g still queries for it
+            sess[CURR_USER_KEY] = -1
+
+        resp = self.client.get("/login")
+        self.assertEqual(resp.status_code, 200)
+
+        [trace] = exporter.traces
+        spans = {span.name: span for span in trace.spans}
+        root = trace.spans[0]
+
+        self.assertEqual(root.name, "request")
+        self.assertEqual(root.attributes["path"], "/login")
+        self.assertEqual(spans["view"].attributes["endpoint"], "auth.login")
+        self.assertEqual(spans["render"].attributes["template"],
+                         "users/login.html")
+        self.assertIn("FROM users", spans["sql"].attributes["statement"])
+
+        # Spans nest: the query runs in add_user_to_g, the render in the view
+        self.assertEqual(spans["sql"].parent_id,
+                         spans["add_user_to_g"].span_id)
+        self.assertEqual(spans["render"].parent_id, spans["view"].span_id)
+        self.assertEqual(spans["view"].parent_id, root.span_id)
+        self.assertTrue(all(span.duration is not None for span in trace.spans))
+
+    def test_not_sampled(self):
+        """Requests that aren't sampled aren't exported..."""
+
+        app.config["TRACE_SAMPLE_RATE"] = 0.0
+        self.client.get("/login")
+
+        self.assertEqual(exporter.traces, [])
+
+    def test_slow(self):
+        """... unless they are slow"""
+
+        app.config.update(TRACE_SAMPLE_RATE=0.0, TRACE_SLOW_MS=0)
+        self.client.get("/login")
+
+        [trace] = exporter.traces
+        self.assertTrue(trace.spans[0].attributes["slow"])
+
+    def test_json_lines(self):
+        """The default exporter writes a JSON line per span"""
+
+        self.client.get("/login")
+        [trace] = exporter.traces
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traces.jsonl")
+            JSONLinesExporter(create_test_app(TRACE_FILE=path)).export(trace)
+
+            with open(path) as file:
+                spans = [json.loads(line) for line in file]
+
+        self.assertEqual(len(spans), len(trace.spans))
+        self.assertEqual({span["trace_id"] for span in spans}, {trace.trace_id})
+        self.assertEqual(spans[0]["name"], "request")
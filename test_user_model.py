@@ -4,40 +4,27 @@
 #
 #    python -m unittest test_user_model.py
 
-from app import app
-import os
-from unittest import TestCase
-from sqlalchemy import exc
-
-from models import db, User, Book, UserBook
-
-# BEFORE we import our app, let's set an environmental variable
-# to use a different database for tests (we need to do this
-# before we import our app, since that will have already
-# connected to the database
-
-os.environ['DATABASE_URL'] = "postgresql:///nyt_best_sellers_test"
-
+from unittest.mock import patch
 
-# Now we can import app
+from sqlalchemy import exc
 
-# Create our tables (we do this here, so we only create the tables
-# once for all tests --- in each test, we'll delete the data
-# and create fresh new clean test data
+from models import db, User, Book, UserBook, Follow, FeedEntry
+from testing import create_test_app, DBTestCase
 
-db.create_all()
+# The app works on the test database, and each test's changes are rolled
+# back (see testing.py), so there is no data to delete between tests
+app = create_test_app()
 
 
-class UserModelTestCase(TestCase):
+class UserModelTestCase(DBTestCase):
     """Test views for messages."""
 
+    app = app
+
     def setUp(self):
         """Create test client, add sample data."""
 
-        db.drop_all()
-        db.create_all()
-
-        User.query.delete()
+        super().setUp()
 
         u1 = User.signup(
             "test_user1", "test_email1@email.com", "test_password", None)
@@ -48,11 +35,6 @@ class UserModelTestCase(TestCase):
 
         self.client = app.test_client()
 
-    def tearDown(self):
-        """Clean up any fouled transaction."""
-
-        db.session.rollback()
-
     def test_user_model(self):
         """Does basic model work?"""
 
@@ -124,3 +106,24 @@ class UserModelTestCase(TestCase):
         self.assertFalse(bad_user)
         bad_password = User.authenticate(self.u1.username, "wrong")
         self.assertFalse(bad_password)
+
+    def test_feed_trimmed(self):
+        """Fan-out keeps only the newest entries of each feed"""
+
+        u2 = User(email="test2@test.com", username="testuser2",
+                  password="HASHED_PASSWORD")
+        db.session.add(u2)
+        db.session.commit()
+        db.session.add(Follow(follower_id=self.u1.id, followed_id=u2.id))
+        book = Book.add_book("FAIRY TALE", "Stephen King", "description",
+                             "Scribner", isbn_10="1668002175")
+        db.session.commit()
+
+        with patch("models.FEED_INBOX_LIMIT", 2):
+            for verb in ("tracked", "read", "tracked"):
+                FeedEntry.fan_out(u2.id, book.id, verb)
+        db.session.commit()
+
+        entries = FeedEntry.query.filter_by(owner_id=self.u1.id).all()
+        self.assertEqual(sorted(entry.verb for entry in entries),
+                         ["read", "tracked"])
@@ -5,45 +5,44 @@
 #    FLASK_ENV=production python -m unittest test_views.py
 
 
-from app import app, CURR_USER_KEY
-import os
-from unittest import TestCase
-
-from models import db, connect_db, Book, User, UserBook
-
-# BEFORE we import our app, let's set an environmental variable
-# to use a different database for tests (we need to do this
-# before we import our app, since that will have already
-# connected to the database
-
-os.environ['DATABASE_URL'] = "postgresql:///nyt_best_sellers_test"
-
-
-# Now we can import app
-
-
-# Create our tables (we do this here, so we only create the tables
-# once for all tests --- in each test, we'll delete the data
-# and create fresh new clean test data
+from functions import CURR_USER_KEY
+from history import record_snapshot
+from isbn import normalize_isbn
+from models import db, Book, User, UserBook
+from overview import Overview, OverviewList, OverviewBook
+from testing import create_test_app, DBTestCase
+
+# The test app works on the test database, without CSRF, and replays the
+# NY Times API from recordings/ (see testing.py). Each test's changes are
+# rolled back, so we don't have to delete the data in setUp.
+#
+# Inside `with self.client` the test client keeps the request context of
+# a streamed page pushed, render them in one piece (see test_streamed_page)
+app = create_test_app(STREAM_TEMPLATES=False)
 
-db.create_all()
+# ISBN10 for Fairy Tale by Stephen King (publisher = Scribner), in the
+# recorded overview
+TEST_ISBN = 1668002175
 
-# Don't have WTForms use CSRF at all, since it's a pain to test
 
-app.config['WTF_CSRF_ENABLED'] = False
+def overview(published_date, isbns):
+    """An overview with one list of the books of `isbns`, in rank order"""
 
-# ISBN10 for Fairy Tale by Stephen King (publisher = Scribner)
-TEST_ISBN = 1668002175
+    books = [OverviewBook("", "", rank, "", *normalize_isbn(isbn))
+             for rank, isbn in enumerate(isbns, start=1)]
+    return Overview(published_date,
+                    [OverviewList("Hardcover Nonfiction", books)])
 
 
-class ViewTestCase(TestCase):
+class ViewTestCase(DBTestCase):
     """Test views pages"""
 
+    app = app
+
     def setUp(self):
         """Create test client, add sample data."""
 
-        User.query.delete()
-        Book.query.delete()
+        super().setUp()
 
         self.client = app.test_client()
 
@@ -66,14 +65,10 @@ class ViewTestCase(TestCase):
 
         self.testuser = testuser
         self.book = book
+        self.book_id = book.id
         self.book2 = book2
         self.relation = relation
 
-    def tearDown(self):
-        """Clean up any fouled transaction."""
-
-        db.session.rollback()
-
     def test_bs_overview(self):
         """Render homepage"""
 
@@ -101,6 +96,26 @@ class ViewTestCase(TestCase):
             # Testing for book cards to render
             self.assertIn('<div class="card-body">', html)
 
+    def test_bs_overview_tracked(self):
+        """Tracked books should be marked on the homepage"""
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            html = c.get("/").get_data(as_text=True)
+            # The ISBN of the first book's "Track" button
+            isbn = html.split('/track"', 1)[0].rsplit("/books/", 1)[1]
+
+            # Tracking a book from the homepage brings us back there
+            resp = c.post(f"/books/{isbn}/track", data={"next": "/"})
+            self.assertEqual(resp.location, "http://localhost/")
+
+            html = c.get("/").get_data(as_text=True)
+            # The book should be tracked and not read
+            self.assertIn(f"/books/stop-tracking/{isbn}", html)
+            self.assertIn(f"/users/books/{isbn}/read", html)
+
     def test_anon_homepage(self):
         """Render homepage when no user is logged in"""
 
@@ -144,6 +159,52 @@ class ViewTestCase(TestCase):
             # Book should be untracked
             self.assertIn("Track", html)
 
+    def test_invalid_isbn(self):
+        """Malformed ISBNs are refused without calling the API"""
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            resp = c.get("/books/1250278245")
+
+            # Redirected home with a message
+            self.assertEqual(resp.status_code, 302)
+            with c.session_transaction() as sess:
+                self.assertIn(("danger", "The ISBN is incorrect."),
+                              sess["_flashes"])
+
+            # Non-ASCII digits too
+            resp = c.post("/books/²²²²²²²²²0/track")
+            self.assertEqual(resp.status_code, 302)
+
+    def test_unrecorded_book(self):
+        """A book the replayed API has no recording of isn't found"""
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            resp = c.get("/books/080442957X")
+
+            self.assertEqual(resp.status_code, 302)
+            with c.session_transaction() as sess:
+                self.assertIn(("danger", "Book's details curently unavailable."),
+                              sess["_flashes"])
+
+    def test_book_show_isbn_13(self):
+        """Books can be found by their ISBN-13 too"""
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            resp = c.get("/books/978-1250278241")
+            html = resp.get_data(as_text=True)
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("DESPERATION IN DEATH", html)
+
     def test_book_track(self):
         """Testing for tracking a book """
 
@@ -162,6 +223,126 @@ class ViewTestCase(TestCase):
             self.assertIn('<h5 class="card-title">by J.D. Robb</h5>', html)
             # Book should be unread
             self.assertIn("Not read", html)
+            # The book's trackers counter should be updated
+            self.assertEqual(Book.query.get(self.book_id).trackers_count, 1)
+
+    def test_book_untrack(self):
+        """Testing for untracking a read book"""
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            c.post("/books/1250278244/track")
+            c.post("/users/books/1250278244/read")
+            book = Book.query.get(self.book_id)
+            # The book should have 1 tracker that read it
+            self.assertEqual(book.trackers_count, 1)
+            self.assertEqual(book.readers_count, 1)
+
+            resp = c.post("/books/stop-tracking/1250278244",
+                          follow_redirects=True)
+            html = resp.get_data(as_text=True)
+
+            # Book should be untracked and the counters back to 0
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("Track", html)
+            book = Book.query.get(self.book_id)
+            self.assertEqual(book.trackers_count, 0)
+            self.assertEqual(book.readers_count, 0)
+
+    def test_tracked_book_changes(self):
+        """Testing for the weekly changes of the tracked books to show"""
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            c.post("/books/1982185821/track")
+
+            # Our book went from #2 to #1
+            record_snapshot(overview("2022-10-23", ["1250278244", "1982185821"]))
+            record_snapshot(overview("2022-10-30", ["1982185821", "0000000000"]))
+
+            resp = c.get("/users/books")
+            html = resp.get_data(as_text=True)
+
+            # Testing for good response
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("to #1 on Hardcover Nonfiction", html)
+            # The untracked book that left the list shouldn't show
+            self.assertNotIn("Left", html)
+
+    def test_isbn_13_only_history(self):
+        """Books with only an ISBN-13 (979) get their history and changes"""
+
+        Book.add_book("LE LIVRE", "Auteur", "description", "Editeur",
+                      isbn_13="9791032305690")
+        db.session.commit()
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            c.post("/books/9791032305690/track")
+
+            # Our book went from #1 to #2
+            record_snapshot(overview("2022-10-23", ["9791032305690", "1250278244"]))
+            record_snapshot(overview("2022-10-30", ["1250278244", "9791032305690"]))
+
+            html = c.get("/books/9791032305690").get_data(as_text=True)
+            self.assertIn('class="sparkline"', html)
+            self.assertIn("down 1 this", html)
+
+            html = c.get("/users/books").get_data(as_text=True)
+            self.assertIn("to #2 on Hardcover Nonfiction", html)
+
+            # Once off the list, its last movement isn't this week's
+            record_snapshot(overview("2022-11-06", ["1250278244"]))
+            html = c.get("/books/9791032305690").get_data(as_text=True)
+            self.assertNotIn("this week", html)
+
+    def test_streamed_page(self):
+        """The tracked books page is streamed and shows the flashed messages
+        only once"""
+
+        app.config['STREAM_TEMPLATES'] = True
+        self.addCleanup(app.config.update, STREAM_TEMPLATES=False)
+
+        with self.client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.testuser.id
+
+        self.client.post("/books/1250278244/track")
+
+        with self.client.session_transaction() as sess:
+            sess["_flashes"] = [("success", "Welcome back!")]
+
+        resp = self.client.get("/users/books", buffered=False)
+        self.assertTrue(resp.is_streamed)
+        html = resp.get_data(as_text=True)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("DESPERATION IN DEATH", html)
+        self.assertIn("Welcome back!", html)
+
+        # The message was taken out of the session before it was sent
+        with self.client.session_transaction() as sess:
+            self.assertNotIn("_flashes", sess)
+
+    def test_popular_books(self):
+        """Testing for the most tracked books to show"""
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            c.post("/books/1250278244/track")
+            resp = c.get("/books/popular")
+            html = resp.get_data(as_text=True)
+
+            # Testing for good response
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("Most tracked", html)
 
     ##############################################
     ######USER VIEWS##############################
@@ -185,3 +366,48 @@ class ViewTestCase(TestCase):
             self.assertIn("test@test.com", html)
             # User should have 0 books
             self.assertIn("<p>0</p>", html)
+
+    def test_follow_feed(self):
+        """Testing for followed users' activity to show in the feed"""
+
+        reader = User.signup(username="reader",
+                             email="reader@test.com",
+                             password="reader",
+                             image_url=None)
+        db.session.commit()
+        reader_id = reader.id
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            resp = c.post(f"/users/{reader_id}/follow", follow_redirects=True)
+            html = resp.get_data(as_text=True)
+
+            # We should be able to unfollow now
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("Unfollow", html)
+
+            # The followed user tracks a book
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = reader_id
+            c.post("/books/1250278244/track")
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+            resp = c.get("/users/feed")
+            html = resp.get_data(as_text=True)
+
+            # The activity should be in our feed
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("reader", html)
+            self.assertIn("tracked", html)
+            self.assertIn("DESPERATION IN DEATH", html)
+
+            # And we should see their library
+            resp = c.get(f"/users/{reader_id}/books")
+            html = resp.get_data(as_text=True)
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("reader's tracked books", html)
+            self.assertIn("DESPERATION IN DEATH", html)
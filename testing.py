@@ -0,0 +1,145 @@
+"""Helpers for the tests.
+
+The test apps replay the NY Times API from recordings/ (no network
+needed) and every DBTestCase test runs in a transaction that is rolled
+back at the end, so the tests don't have to empty the tables and can run
+in parallel:
+
+    pytest -n auto
+
+Each pytest-xdist worker gets its own databases (nyt_best_sellers_test_gw0,
+...), created on first use. Their tables are recreated once per test
+run, so they always have the current schema.
+"""
+
+import os
+from unittest import TestCase
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine.url import make_url
+
+from book_cache import _books
+from functions import cache
+from models import db
+
+TEST_DATABASE_URL = os.environ.get(
+    'TEST_DATABASE_URL', "postgresql:///nyt_best_sellers_test")
+TEST_REPLICA_URL = os.environ.get(
+    'TEST_REPLICA_URL', "postgresql:///nyt_best_sellers_test_replica")
+
+# The databases whose tables this process already recreated
+_recreated = set()
+
+
+def database_url(url):
+    """The database `url` of this test process (one per pytest-xdist
+    worker, created if needed)."""
+
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    if not worker:
+        return url
+
+    url = make_url(url)
+    url.database = f"{url.database}_{worker}"
+    create_database(url)
+
+    return str(url)
+
+
+def create_database(url):
+    """Create the database of `url` if it doesn't exist."""
+
+    server_url = make_url(str(url))
+    server_url.database = "postgres"
+    server = create_engine(server_url, isolation_level="AUTOCOMMIT")
+
+    with server.connect() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM pg_database WHERE datname = :name"),
+            name=url.database).scalar()
+        if not exists:
+            connection.execute(f'CREATE DATABASE "{url.database}"')
+
+    server.dispose()
+
+
+def create_tables(engine):
+    """Create the tables in the database of `engine`, dropping them first
+    the first time this process uses it: create_all doesn't change
+    existing tables, which a database kept from an older schema has."""
+
+    url = str(engine.url)
+    if url not in _recreated:
+        db.Model.metadata.drop_all(engine)
+        _recreated.add(url)
+
+    db.Model.metadata.create_all(engine)
+
+
+def create_test_app(**config):
+    """Create the app on the test database, with its tables, replaying
+    the NY Times API."""
+
+    from app import create_app
+
+    app = create_app(dict({
+        'SQLALCHEMY_DATABASE_URI': database_url(TEST_DATABASE_URL),
+        'NYT_MODE': "replay",
+        'WTF_CSRF_ENABLED': False,
+        # Don't write the tests' traces to traces.jsonl
+        'TRACING': False,
+    }, **config))
+
+    with app.app_context():
+        create_tables(db.engine)
+
+    return app
+
+
+def begin_savepoint(session, transaction, connection):
+    """Run the session's work in a savepoint of the test's transaction."""
+
+    if not transaction.nested:
+        session.begin_nested()
+
+
+def restart_savepoint(session, transaction):
+    """Start a new savepoint when the app commits or rolls back the
+    current one."""
+
+    if transaction.nested and not transaction._parent.nested:
+        session.expire_all()
+        session.begin_nested()
+
+
+class DBTestCase(TestCase):
+    """A test whose database changes are rolled back at the end.
+
+    The session is bound to a connection in a transaction, and the app's
+    commits and rollbacks only release or roll back savepoints in it.
+    Set `app` to the test app.
+    """
+
+    app = None
+
+    def setUp(self):
+        self.connection = db.get_engine(self.app).connect()
+        self.transaction = self.connection.begin()
+
+        self._session = db.session
+        db.session = db.create_scoped_session(
+            {"bind": self.connection, "binds": {}})
+        event.listen(db.session, "after_begin", begin_savepoint)
+        event.listen(db.session, "after_transaction_end", restart_savepoint)
+
+    def tearDown(self):
+        db.session.remove()
+        db.session = self._session
+
+        self.transaction.rollback()
+        self.connection.close()
+
+        # Don't keep what the rolled back test cached
+        _books.clear()
+        with self.app.app_context():
+            cache.clear()
@@ -0,0 +1,308 @@
+"""Lightweight request tracing.
+
+Every request gets a trace made of spans: the request itself, its view,
+the SQL statements, cache lookups, NY Times API calls and template
+renders it runs. Spans are only timed in memory while the request runs;
+when it ends the trace is exported if it was sampled (TRACE_SAMPLE_RATE)
+or if it took longer than TRACE_SLOW_MS, so slow requests are always
+captured.
+
+The default exporter appends the spans as JSON lines to TRACE_FILE. Any
+object with an export(trace) method can be used instead (TRACE_EXPORTER).
+"""
+
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import (g, current_app, has_app_context, request,
+                   before_render_template, template_rendered, request_started)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.utils import import_string
+
+# Spans kept per trace, so a page with thousands of queries can't use up
+# the memory (the ones after that are only counted)
+MAX_SPANS = 1000
+# Longest SQL statement text kept in a span
+MAX_STATEMENT = 500
+
+
+class Span:
+    """A timed operation of a trace."""
+
+    __slots__ = ("name", "span_id", "parent_id", "start", "duration",
+                 "attributes", "_started")
+
+    def __init__(self, name, parent_id, attributes):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration = None
+        self._started = time.perf_counter()
+
+    def set(self, key, value):
+        """Add an attribute to the span."""
+
+        self.attributes[key] = value
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+
+class _NoSpan:
+    """What span() gives when there's no trace to add to."""
+
+    def set(self, key, value):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Trace:
+    """The spans of one request."""
+
+    def __init__(self, sampled):
+        self.trace_id = os.urandom(16).hex()
+        self.sampled = sampled
+        self.spans = []
+        self.dropped = 0
+        # The open spans, the last one is the parent of new spans
+        self._stack = []
+
+    def start_span(self, name, leaf=False, **attributes):
+        """Start a span under the current one. Leaf spans (e.g. SQL
+        statements) never get children, so they aren't made current."""
+
+        parent_id = self._stack[-1].span_id if self._stack else None
+        span = Span(name, parent_id, attributes)
+
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+        if not leaf:
+            self._stack.append(span)
+
+        return span
+
+    def end_span(self, span):
+        span.finish()
+        if self.current is span:
+            self._stack.pop()
+
+    @property
+    def current(self):
+        """The innermost open span, or None."""
+
+        return self._stack[-1] if self._stack else None
+
+    @property
+    def duration(self):
+        """Duration of the root span (the request)."""
+
+        return self.spans[0].duration if self.spans else 0
+
+    def to_dicts(self):
+        """The spans as plain dicts, ready to be dumped to JSON."""
+
+        return [{"trace_id": self.trace_id,
+                 "span_id": span.span_id,
+                 "parent_id": span.parent_id,
+                 "name": span.name,
+                 "start": span.start,
+                 "duration_ms": round((span.duration or 0) * 1000, 3),
+                 "attributes": span.attributes}
+                for span in self.spans]
+
+
+class JSONLinesExporter:
+    """Append each span of the exported traces as a JSON line to
+    TRACE_FILE."""
+
+    def __init__(self, app):
+        self.path = app.config['TRACE_FILE']
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        lines = "".join(json.dumps(span, default=str) + "\n"
+                        for span in trace.to_dicts())
+
+        # One write per trace, in append mode, so the lines of concurrent
+        # workers don't interleave
+        with self._lock, open(self.path, "a") as file:
+            file.write(lines)
+
+
+def current_trace():
+    """The trace of the current request, or None."""
+
+    if not has_app_context():
+        return None
+
+    return g.get("trace")
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the code in the with block as a span of the current trace.
+
+    Gives the span, to add attributes to it with span.set(). Does nothing
+    outside of a traced request (e.g. in the background worker).
+    """
+
+    trace = current_trace()
+    if trace is None:
+        yield _NO_SPAN
+        return
+
+    current = trace.start_span(name, **attributes)
+    try:
+        yield current
+    except Exception as error:
+        current.set("error", repr(error))
+        raise
+    finally:
+        trace.end_span(current)
+
+
+def traced_iter(name, iterable, **attributes):
+    """Iterate over `iterable` in a span, e.g. a streamed template."""
+
+    with span(name, **attributes):
+        yield from iterable
+
+
+def init_tracing(app, cache):
+    """Trace the app's requests, views, SQL, `cache` and templates.
+
+    Call it once the blueprints are registered, so their views are traced.
+    """
+
+    if not app.config['TRACING']:
+        return
+
+    exporter = app.config['TRACE_EXPORTER']
+    if isinstance(exporter, str):
+        exporter = import_string(exporter)(app)
+    app.extensions['tracing'] = exporter
+
+    request_started.connect(start_trace, app)
+    app.teardown_request(finish_trace)
+
+    for endpoint, view in app.view_functions.items():
+        app.view_functions[endpoint] = traced_view(endpoint, view)
+
+    # Memoized functions go through the cache backend's methods
+    backend = app.extensions['cache'][cache]
+    for method in ("get", "set", "add", "delete", "get_many", "set_many"):
+        setattr(backend, method,
+                traced_cache_method(method, getattr(backend, method)))
+
+    before_render_template.connect(start_render, app)
+    template_rendered.connect(finish_render, app)
+
+    # Listening on the Engine class covers the primary and the replica
+    if not event.contains(Engine, "before_cursor_execute", start_statement):
+        event.listen(Engine, "before_cursor_execute", start_statement)
+        event.listen(Engine, "after_cursor_execute", finish_statement)
+        event.listen(Engine, "handle_error", fail_statement)
+
+
+def start_trace(app, **extra):
+    """Start the trace of a request, with its root span."""
+
+    trace = Trace(random.random() < app.config['TRACE_SAMPLE_RATE'])
+    trace.start_span("request", method=request.method, path=request.path)
+    g.trace = trace
+
+
+def finish_trace(error=None):
+    """Close the request's span and export the trace if it was sampled or
+    slow (for streamed pages this runs once the page is sent)."""
+
+    trace = g.pop("trace", None)
+    if trace is None or not trace.spans:
+        return
+
+    root = trace.spans[0]
+    if error is not None:
+        root.set("error", repr(error))
+    if trace.dropped:
+        root.set("dropped_spans", trace.dropped)
+    trace.end_span(root)
+
+    slow = trace.duration * 1000 >= current_app.config['TRACE_SLOW_MS']
+    if trace.sampled or slow:
+        root.set("slow", slow)
+        try:
+            current_app.extensions['tracing'].export(trace)
+        except Exception:
+            # Never fail a request because of its trace
+            current_app.logger.exception("Couldn't export trace")
+
+
+def traced_view(endpoint, view):
+    """Wrap a view function in a span (keeps its attributes, e.g. read_only)."""
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with span("view", endpoint=endpoint):
+            return view(*args, **kwargs)
+
+    return wrapper
+
+
+def traced_cache_method(method, func):
+    """Wrap a cache backend method in a span."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(f"cache.{method}") as current:
+            result = func(*args, **kwargs)
+            if method == "get":
+                current.set("hit", result is not None)
+            return result
+
+    return wrapper
+
+
+def start_render(app, template, context, **extra):
+    trace = current_trace()
+    if trace is not None:
+        trace.start_span("render", template=template.name)
+
+
+def finish_render(app, template, context, **extra):
+    trace = current_trace()
+    if trace is not None and trace.current and trace.current.name == "render":
+        trace.end_span(trace.current)
+
+
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    trace = current_trace()
+    if trace is not None:
+        context._trace_span = trace.start_span(
+            "sql", leaf=True, statement=statement[:MAX_STATEMENT],
+            database=conn.engine.url.database)
+
+
+def finish_statement(conn, cursor, statement, parameters, context, executemany):
+    current = getattr(context, "_trace_span", None)
+    if current is not None:
+        current.finish()
+
+
+def fail_statement(exception_context):
+    current = getattr(exception_context.execution_context, "_trace_span", None)
+    if current is not None:
+        current.set("error", repr(exception_context.original_exception))
+        current.finish()
@@ -0,0 +1,213 @@
+"""User and user-books routes."""
+
+from flask import Blueprint, render_template, flash, redirect, g, request
+
+from book_cache import get_book
+from forms import UserEditForm
+from functions import do_logout, read_only, redirect_back, render_streamed
+from isbn import normalize_isbn
+from models import db, User, Book, UserBook, Follow, FeedEntry, BookChange
+
+users = Blueprint("users", __name__)
+
+#######################################################################################
+#############USER-BOOKS ROUTES ##########################################################
+#######################################################################################
+
+
+@users.route('/users/books')
+@read_only
+def user_books():
+    """Show basic information about the user's tracked books
+    """
+    # If the user is not the one in session redirect
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    else:
+        return render_streamed('user_track_books.html', user=g.user,
+                               changes=BookChange.latest_for_user(g.user.id))
+
+
+@users.route('/users/<int:user_id>/books')
+@read_only
+def other_user_books(user_id):
+    """Show another user's tracked books"""
+    # If the user is not the one in session redirect
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    user = User.query.get_or_404(user_id)
+
+    return render_streamed('user_track_books.html', user=user, changes={})
+
+
+@users.route('/users/feed')
+@read_only
+def feed():
+    """Show what the users the current user follows tracked and read"""
+    # If the user is not the one in session redirect
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    before = request.args.get("before", type=int)
+    entries, next_before = FeedEntry.page(g.user.id, before=before)
+
+    return render_template('feed.html', entries=entries,
+                           next_before=next_before)
+
+
+@users.route('/users/books/<isbn>/read', methods=["POST"])
+def read_unread_book(isbn):
+    """Let user select if they have read the book or not"""
+    # If the user is not the one in session redirect
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    # Malformed ISBNs never reach the DB or the API
+    if not normalize_isbn(isbn):
+        flash("The ISBN is incorrect.", "danger")
+        return redirect("/")
+
+    book = get_book(isbn)
+
+    # If the book is in the DB, we let the user select if the book has been read or not
+
+    if book:
+
+        # query to see if there is a relation between the book and the user
+        relation = UserBook.query.filter(
+            UserBook.user_id == g.user.id, UserBook.book_id == book.id).first()
+
+        # If the relation exist and 'read_or_not' is true, change to false
+        if relation and relation.read_or_not:
+
+            relation.read_or_not = False
+            Book.change_counts(book.id, readers=-1)
+            db.session.commit()
+            return redirect_back("/users/books")
+
+        # If the relation exist and 'read_or_not' is false, change to true
+        elif relation:
+            relation.read_or_not = True
+            Book.change_counts(book.id, readers=1)
+            FeedEntry.fan_out(g.user.id, book.id, "read")
+            db.session.commit()
+            return redirect_back("/users/books")
+
+        # Redirect if the relation doesn't exist
+        else:
+            flash("The user isn't tracking this book.", "danger")
+        return redirect("/")
+
+    # If the book is not in our DB, we redirect to root route
+    else:
+        flash("The book is unavailable to track or the ISBN is incorrect.", "danger")
+        return redirect("/")
+
+
+#######################################################################################
+###################USER ROUTES ##########################################################
+#######################################################################################
+
+@users.route('/users/<int:user_id>')
+@read_only
+def user_details(user_id):
+    """Render user's details page"""
+    # If the user is not the one in session redirect
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    user = User.query.get_or_404(user_id)
+
+    return render_template("users/details.html", user=user)
+
+
+@users.route('/users/<int:user_id>/follow', methods=["POST"])
+def follow(user_id):
+    """Make the current user follow another user"""
+    # If the user is not the one in session redirect
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    followed = User.query.get_or_404(user_id)
+
+    if followed.id == g.user.id:
+        flash("You can't follow yourself.", "danger")
+
+    elif not g.user.is_following(followed):
+        db.session.add(Follow(follower_id=g.user.id, followed_id=followed.id))
+        db.session.commit()
+
+    return redirect(f"/users/{followed.id}")
+
+
+@users.route('/users/<int:user_id>/unfollow', methods=["POST"])
+def unfollow(user_id):
+    """Make the current user stop following another user"""
+    # If the user is not the one in session redirect
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    Follow.query.filter_by(follower_id=g.user.id,
+                           followed_id=user_id).delete()
+    db.session.commit()
+
+    return redirect(f"/users/{user_id}")
+
+
+@users.route('/users/delete', methods=["POST"])
+def delete_user():
+    """Delete user."""
+    # If the user is not the one in session redirect
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    do_logout()
+
+    # delete user from DB (and from the books' counters)
+    Book.remove_user_counts(g.user.id)
+    db.session.delete(g.user)
+    db.session.commit()
+
+    return redirect("/signup")
+
+
+@users.route('/users/edit', methods=["GET", "POST"])
+def profile():
+    """Update profile for current user."""
+    # If the user is not the one in session redirect
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+    # Data to pass to the form to be pre-filled wit the user's data
+    data = {"username": g.user.username,
+            "email": g.user.email, "image_url": g.user.image_url}
+
+    form = UserEditForm(data=data)
+
+    # If the form  has valid data and CRSF-Token
+    if form.validate_on_submit():
+        user = User.authenticate(g.user.username,
+                                 form.password.data)
+        # Change user's info to the form data ifauthentication is correct
+        if user:
+            user.username = form.username.data
+            user.email = form.email.data
+            user.image_url = form.image_url.data
+            db.session.add(user)
+            db.session.commit()
+            flash(f"{user.username}, your changes were made successfully", "success")
+            return redirect(f"/users/{user.id}")
+        # Render form if the credentials are incorrect
+        flash("Invalid credentials.", 'danger')
+
+    return render_template('users/edit.html', form=form)